@@ -0,0 +1,293 @@
+import itertools
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.cache.backends.locmem import LocMemCache
+
+from .timing import count_cache, timed
+
+_missing = object()
+
+# UPDATE ... RETURNING появился в SQLite 3.35.
+HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+
+class InstrumentedCacheMixin:
+    """Считает попадания и промахи get/get_many для Server-Timing."""
+
+    _in_get_many = False
+
+    def get(self, key, default=None, version=None):
+        if self._in_get_many:
+            return super().get(key, default, version)
+        with timed('cache_time'):
+            value = super().get(key, _missing, version)
+        hit = value is not _missing
+        count_cache(int(hit), int(not hit))
+        return value if hit else default
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        # Базовый get_many вызывает get() на каждый ключ — не считаем
+        # их второй раз.
+        self._in_get_many = True
+        try:
+            with timed('cache_time'):
+                values = super().get_many(keys, version=version)
+        finally:
+            self._in_get_many = False
+        count_cache(len(values), len(keys) - len(values))
+        return values
+
+
+class InstrumentedLocMemCache(InstrumentedCacheMixin, LocMemCache):
+    pass
+
+
+class SQLiteCache(BaseCache):
+    """Кэш в файле SQLite, общий для всех процессов узла.
+
+    Файл в режиме WAL: читатели не ждут писателей, а запись одного
+    воркера (в том числе delete() и incr() счётчиков поколений) сразу
+    видна остальным. Целые числа хранятся как INTEGER, поэтому incr()
+    атомарен — это один UPDATE. Размер ограничен MAX_ENTRIES из
+    OPTIONS: переполнение проверяется раз в CULL_EVERY записей, тогда
+    удаляются просроченные записи, а затем давно не читанные (LRU).
+    Время чтения обновляется не чаще раза в TOUCH_INTERVAL секунд на
+    ключ, чтобы попадания почти не писали. Нужен SQLite 3.24+ (UPSERT).
+    """
+
+    TOUCH_INTERVAL = 1
+    CULL_EVERY = 100
+
+    def __init__(self, location, params):
+        if sqlite3.sqlite_version_info < (3, 24, 0):
+            raise ImproperlyConfigured(
+                'SQLiteCache requires SQLite 3.24 or later (found %s).'
+                % sqlite3.sqlite_version
+            )
+        super().__init__(params)
+        self._path = location
+        self._writes = itertools.count(1)
+        self._local = threading.local()
+        self._schema_ready = False
+
+    def _connection(self):
+        # Подключение своё у каждого потока и у процесса после fork.
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.pid = os.getpid()
+            local.connection = sqlite3.connect(
+                self._path, timeout=5, isolation_level=None
+            )
+            local.connection.execute('PRAGMA journal_mode = wal')
+            local.connection.execute('PRAGMA synchronous = normal')
+            if not self._schema_ready:
+                local.connection.execute(
+                    'CREATE TABLE IF NOT EXISTS cache ('
+                    'key TEXT PRIMARY KEY, value BLOB, '
+                    'expires REAL, accessed REAL) WITHOUT ROWID'
+                )
+                local.connection.execute(
+                    'CREATE INDEX IF NOT EXISTS cache_accessed '
+                    'ON cache (accessed)'
+                )
+                self._schema_ready = True
+        return local.connection
+
+    @staticmethod
+    def _encode(value):
+        if type(value) is int and -2 ** 63 <= value < 2 ** 63:
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _decode(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _touch_stale(self, connection, rows, now):
+        stale = [
+            (now, key) for key, _, accessed in rows
+            if accessed < now - self.TOUCH_INTERVAL
+        ]
+        if stale:
+            connection.executemany(
+                'UPDATE cache SET accessed = ? WHERE key = ?', stale
+            )
+
+    def _select(self, keys):
+        connection = self._connection()
+        now = time.time()
+        rows = connection.execute(
+            'SELECT key, value, accessed FROM cache '
+            'WHERE key IN (%s) AND (expires IS NULL OR expires > ?)'
+            % ', '.join('?' * len(keys)),
+            (*keys, now),
+        ).fetchall()
+        self._touch_stale(connection, rows, now)
+        return {key: self._decode(value) for key, value, _ in rows}
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        return self._select([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        if not keys:
+            return {}
+        found = {}
+        # Ограничение SQLite на число параметров запроса.
+        names = list(keys)
+        for start in range(0, len(names), 500):
+            found.update(self._select(names[start:start + 500]))
+        return {keys[key]: value for key, value in found.items()}
+
+    def _store(self, rows, only_missing=False):
+        connection = self._connection()
+        now = time.time()
+        update = (
+            'DO UPDATE SET value = excluded.value, '
+            'expires = excluded.expires, accessed = excluded.accessed'
+        )
+        if only_missing:
+            update += (
+                ' WHERE cache.expires IS NOT NULL AND cache.expires <= ?'
+            )
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            changed = 0
+            for key, value, expires in rows:
+                params = [key, self._encode(value), expires, now]
+                if only_missing:
+                    params.append(now)
+                changed += connection.execute(
+                    'INSERT INTO cache (key, value, expires, accessed) '
+                    'VALUES (?, ?, ?, ?) ON CONFLICT (key) ' + update,
+                    params,
+                ).rowcount
+            # COUNT(*) — полный проход по таблице, поэтому размер
+            # проверяется не на каждой записи, как в кэше Django в БД,
+            # а раз в CULL_EVERY.
+            if next(self._writes) % self.CULL_EVERY == 0:
+                self._cull(connection, now)
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return changed
+
+    def _cull(self, connection, now):
+        count = connection.execute('SELECT COUNT(*) FROM cache').fetchone()
+        if count[0] <= self._max_entries:
+            return
+        connection.execute(
+            'DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?',
+            (now,),
+        )
+        count = connection.execute('SELECT COUNT(*) FROM cache').fetchone()
+        if count[0] <= self._max_entries:
+            return
+        connection.execute(
+            'DELETE FROM cache WHERE key IN ('
+            'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+            (max(count[0] // self._cull_frequency, 1)
+             if self._cull_frequency else count[0],),
+        )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        return bool(self._store(
+            [(self._key(key, version), value, expires)], only_missing=True
+        ))
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        self._store([(self._key(key, version), value, expires)])
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        self._store([
+            (self._key(key, version), value, expires)
+            for key, value in data.items()
+        ])
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        return bool(self._connection().execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (expires, self._key(key, version), time.time()),
+        ).rowcount)
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        connection = self._connection()
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            connection.execute(
+                'DELETE FROM cache WHERE key IN (%s)'
+                % ', '.join('?' * len(chunk)),
+                chunk,
+            )
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return key in self._select([key])
+
+    def incr(self, key, delta=1, version=None):
+        connection = self._connection()
+        name = self._key(key, version)
+        update = (
+            'UPDATE cache SET value = value + ? WHERE key = ? '
+            "AND typeof(value) = 'integer' "
+            'AND (expires IS NULL OR expires > ?)'
+        )
+        params = (delta, name, time.time())
+        if HAS_RETURNING:
+            row = connection.execute(
+                update + ' RETURNING value', params
+            ).fetchone()
+        else:
+            # Без RETURNING новое значение читается в той же транзакции.
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                row = None
+                if connection.execute(update, params).rowcount:
+                    row = connection.execute(
+                        'SELECT value FROM cache WHERE key = ?', (name,)
+                    ).fetchone()
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+        if row is None:
+            raise ValueError("Key '%s' not found" % key)
+        return row[0]
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Подключения живут весь процесс: открывать файл на каждый
+        # запрос дороже, чем держать его открытым.
+        pass
+
+
+class InstrumentedSQLiteCache(InstrumentedCacheMixin, SQLiteCache):
+    pass
@@ -0,0 +1,117 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .routers import replica_lag
+
+TAG_KEY = 'tag:{tag}'
+
+_started = ContextVar('cache_tags_started', default=None)
+# Отметки served_stale() для ближайшего объемлющего collect_stale().
+_stale = ContextVar('cache_tags_stale', default=None)
+
+
+def request_started():
+    """Когда начался текущий запрос (time.time()); вне запроса — сейчас.
+
+    Всё, что запрос прочитал из базы, не старше этого момента, поэтому
+    закэшированное им действительно, пока его теги не сбрасывались
+    позже (см. is_fresh). Реплика может отставать от основной базы,
+    поэтому для чтений с неё момент сдвигается на её MAX_LAG назад.
+    """
+    started = _started.get()
+    if started is None:
+        started = time.time()
+    return started - replica_lag()
+
+
+def tag_versions(tags):
+    """Поколения тегов — время их последнего сброса: {'post:1': ...}.
+
+    Одно чтение get_many на все теги. Пропавший из кэша тег заводится
+    сброшенным перед началом текущего запроса: то, что кэширует этот
+    запрос, действительно, а вытеснение тега не оживит записи старше.
+    """
+    keys = {TAG_KEY.format(tag=tag): tag for tag in tags}
+    found = cache.get_many(keys)
+    versions = {keys[key]: version for key, version in found.items()}
+    for key, tag in keys.items():
+        if key not in found:
+            cache.add(key, request_started() - 0.001, None)
+            versions[tag] = cache.get(key)
+    return versions
+
+
+def remember(tags):
+    """Заводит недостающие теги перед сохранением значения с ними."""
+    tag_versions(tags)
+
+
+def is_fresh(tags, started):
+    """Записано ли значение, начатое в started, после сброса всех тегов."""
+    return all(
+        version < started for version in tag_versions(tags).values()
+    )
+
+
+def served_stale():
+    """Отмечает, что вычисление отдало устаревшее значение из кэша.
+
+    Собранное из него (фрагмент, страница) тоже устарело, и сохранять
+    его свежим нельзя — см. collect_stale().
+    """
+    served = _stale.get()
+    if served is not None:
+        served.append(True)
+
+
+@contextmanager
+def collect_stale():
+    """Собирает отметки served_stale() внутри блока в список.
+
+    Непустой список значит, что результат блока собран из устаревших
+    значений. Отметка передаётся и объемлющему collect_stale(): фрагмент
+    внутри страницы делает устаревшей и страницу.
+    """
+    served = []
+    token = _stale.set(served)
+    try:
+        yield served
+    finally:
+        _stale.reset(token)
+    if served:
+        served_stale()
+
+
+def _touch(tags):
+    now = time.time()
+    cache.set_many({TAG_KEY.format(tag=tag): now for tag in tags}, None)
+
+
+def invalidate(*tags):
+    """Сбрасывает всё закэшированное с любым из тегов: одна запись на тег.
+
+    Внутри транзакции теги сбрасываются ещё раз после коммита: до него
+    читатели видят старые строки и могли закэшировать их позже первого
+    сброса.
+    """
+    _touch(tags)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _touch(tags))
+
+
+class CacheTagsMiddleware:
+    """Запоминает начало запроса для request_started()."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _started.set(time.time())
+        try:
+            return self.get_response(request)
+        finally:
+            _started.reset(token)
@@ -0,0 +1,250 @@
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from . import thumbnails, writer
+
+# Слот таблицы: имя метрики с метками и значение.
+SLOT = struct.Struct('120sd')
+# Имя освобождённого слота: поиск идёт через него дальше, а новый
+# ключ может его занять.
+DELETED = b'\x01'
+
+# Границы корзин гистограммы времени ответа, в секундах.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+TYPES = {
+    'yatube_requests_total': 'counter',
+    'yatube_request_duration_seconds': 'histogram',
+    'yatube_db_queries_total': 'counter',
+    'yatube_db_seconds_total': 'counter',
+    'yatube_cache_hits_total': 'counter',
+    'yatube_cache_misses_total': 'counter',
+    'yatube_cache_hit_ratio': 'gauge',
+    'yatube_thumbnail_queue_depth': 'gauge',
+    'yatube_writer_queue_depth': 'gauge',
+}
+
+
+class SharedCounters:
+    """Хеш-таблица счётчиков в файле, отображённом в память.
+
+    Все воркеры открывают один файл, поэтому видят общие значения;
+    изменения идут под flock. Без path таблица живёт в анонимной
+    памяти одного процесса — так в тестах.
+    """
+
+    def __init__(self, path, slots):
+        self._slots = slots
+        size = SLOT.size * slots
+        if path:
+            self._file = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            if os.fstat(self._file).st_size < size:
+                os.ftruncate(self._file, size)
+            self._map = mmap.mmap(self._file, size)
+        else:
+            self._file = None
+            self._map = mmap.mmap(-1, size)
+        # Слот ключа не меняется, поэтому его можно запомнить.
+        self._index = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            if self._file is None:
+                yield
+                return
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+
+    def _find(self, key):
+        offset = self._index.get(key)
+        if offset is not None:
+            return offset
+        start = zlib.crc32(key) % self._slots
+        free = None
+        for step in range(self._slots):
+            offset = (start + step) % self._slots * SLOT.size
+            stored, _ = SLOT.unpack_from(self._map, offset)
+            stored = stored.rstrip(b'\0')
+            if stored == key:
+                break
+            if stored == DELETED:
+                free = offset if free is None else free
+            elif not stored:
+                offset = offset if free is None else free
+                SLOT.pack_into(self._map, offset, key, 0.0)
+                break
+        else:
+            if free is None:
+                return None
+            offset = free
+            SLOT.pack_into(self._map, offset, key, 0.0)
+        self._index[key] = offset
+        return offset
+
+    def update(self, add=(), replace=()):
+        """Прибавляет значения add и записывает значения replace."""
+        with self._locked():
+            for values, increment in ((add, True), (replace, False)):
+                for key, value in dict(values).items():
+                    key = key.encode()
+                    offset = self._find(key) if len(key) <= 120 else None
+                    if offset is None:
+                        continue
+                    if increment:
+                        value += SLOT.unpack_from(self._map, offset)[1]
+                    SLOT.pack_into(self._map, offset, key, value)
+
+    def delete(self, keys):
+        """Освобождает слоты ключей для новых.
+
+        Живые ключи не сдвигаются, поэтому запомненные процессами
+        слоты остаются верными; удалять можно только ключи, которые
+        больше никто не пишет.
+        """
+        keys = {key.encode() for key in keys}
+        with self._locked():
+            for slot in range(self._slots):
+                offset = slot * SLOT.size
+                key, _ = SLOT.unpack_from(self._map, offset)
+                key = key.rstrip(b'\0')
+                if key in keys:
+                    SLOT.pack_into(self._map, offset, DELETED, 0.0)
+                    self._index.pop(key, None)
+
+    def items(self):
+        items = []
+        with self._locked():
+            for slot in range(self._slots):
+                key, value = SLOT.unpack_from(self._map, slot * SLOT.size)
+                key = key.rstrip(b'\0')
+                if key and key != DELETED:
+                    items.append((key.decode(), value))
+        return items
+
+
+_store = None
+_store_pid = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    # После fork файл открывается заново: flock на унаследованном
+    # дескрипторе не разделял бы родителя и потомка.
+    global _store, _store_pid
+    with _store_lock:
+        if _store is None or _store_pid != os.getpid():
+            _store_pid = os.getpid()
+            _store = SharedCounters(
+                settings.METRICS_SETINGS['PATH'],
+                settings.METRICS_SETINGS['SLOTS'],
+            )
+    return _store
+
+
+def record(view_name, timing):
+    """Добавляет замеры запроса (core.timing.RequestTiming) в метрики."""
+    labels = f'view="{view_name or "unresolved"}"'
+    add = defaultdict(float, {
+        f'yatube_requests_total|{labels}': 1,
+        f'yatube_request_duration_seconds_count|{labels}': 1,
+        f'yatube_request_duration_seconds_sum|{labels}': timing.total_time,
+        f'yatube_request_duration_seconds_bucket|{labels},le="+Inf"': 1,
+        f'yatube_db_queries_total|{labels}': timing.db_queries,
+        f'yatube_db_seconds_total|{labels}': timing.db_time,
+        'yatube_cache_hits_total|cache="default"': timing.cache_hits,
+        'yatube_cache_misses_total|cache="default"': timing.cache_misses,
+    })
+    for bound in BUCKETS:
+        if timing.total_time <= bound:
+            add[
+                f'yatube_request_duration_seconds_bucket|{labels},'
+                f'le="{bound}"'
+            ] += 1
+    # Очереди у каждого процесса свои: пишем их под pid, а при
+    # выдаче складываем по живым процессам и удаляем ключи мёртвых.
+    pid = f'pid="{os.getpid()}"'
+    get_store().update(add, {
+        f'yatube_thumbnail_queue_depth|{pid}': thumbnails.pending_count(),
+        f'yatube_writer_queue_depth|{pid}': writer.queue_depth(),
+    })
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def render():
+    """Метрики всех процессов в текстовом формате Prometheus."""
+    samples = defaultdict(float)
+    dead = []
+    store = get_store()
+    for key, value in store.items():
+        name, labels = key.split('|', 1)
+        if labels.startswith('pid='):
+            if _alive(int(labels[5:-1])):
+                samples[name, ''] += value
+            else:
+                dead.append(key)
+            continue
+        samples[name, labels] += value
+    if dead:
+        store.delete(dead)
+    hits = samples.get(('yatube_cache_hits_total', 'cache="default"'), 0)
+    misses = samples.get(('yatube_cache_misses_total', 'cache="default"'), 0)
+    if hits + misses:
+        samples['yatube_cache_hit_ratio', 'cache="default"'] = (
+            hits / (hits + misses)
+        )
+    lines = []
+    typed = set()
+    for (name, labels), value in sorted(samples.items()):
+        family = name
+        for suffix in ('_bucket', '_count', '_sum'):
+            if name.endswith(suffix) and name[:-len(suffix)] in TYPES:
+                family = name[:-len(suffix)]
+        if family not in typed:
+            typed.add(family)
+            lines.append(f'# TYPE {family} {TYPES.get(family, "untyped")}')
+        lines.append(
+            f'{name}{{{labels}}} {value!r}' if labels
+            else f'{name} {value!r}'
+        )
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """Пишет замеры ServerTimingMiddleware в общие метрики.
+
+    Стоит в MIDDLEWARE перед ServerTimingMiddleware, чтобы получить
+    уже законченные замеры из request.timing.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        timing = getattr(request, 'timing', None)
+        if timing is not None:
+            match = request.resolver_match
+            record(match.view_name if match else None, timing)
+        return response
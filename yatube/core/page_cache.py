@@ -0,0 +1,108 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import parse_http_date_safe
+
+from .cache_tags import collect_stale, is_fresh, remember, request_started
+
+PAGE_KEY = 'page:{digest}'
+
+
+def is_anonymous(request):
+    """Анонимный ли запрос — по cookie, не заглядывая в сессию.
+
+    Сессия и пользователь грузятся из базы, поэтому на них не
+    смотрим: без cookie сессии запрос точно анонимный. Запрос с
+    cookie истёкшей сессии просто идёт мимо кэша.
+    """
+    return settings.SESSION_COOKIE_NAME not in request.COOKIES
+
+
+def tag_page(request, *tags):
+    """Отмечает, от каких объектов зависит страница ответа.
+
+    Вне cache_anonymous (и для вошедших пользователей) ничего не делает.
+    """
+    page_tags = getattr(request, 'page_cache_tags', None)
+    if page_tags is not None:
+        page_tags.update(tags)
+
+
+def _page_key(request):
+    digest = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return PAGE_KEY.format(digest=digest)
+
+
+def _from_cache(request):
+    entry = cache.get(_page_key(request))
+    if entry is None:
+        return None
+    started, tags, response = entry
+    if not is_fresh(tags, started):
+        return None
+    return get_conditional_response(
+        request,
+        etag=response.get('ETag'),
+        last_modified=parse_http_date_safe(
+            response.get('Last-Modified', '')
+        ),
+        response=response,
+    )
+
+
+def cache_anonymous(view):
+    """Кэш целых страниц для анонимных GET-запросов.
+
+    Ключ — путь со строкой запроса. Представление отмечает через
+    tag_page(), какие объекты показало; страница живёт, пока ни один
+    из её тегов не сброшен после начала запроса (core.cache_tags),
+    но не дольше PAGE_CACHE_SETINGS['TIMEOUT']. Попадание в кэш
+    обходится двумя обращениями к кэшу, без базы и шаблонов.
+    Вошедшим пользователям ответ помечается как private.
+    """
+    @wraps(view)
+    def wrapped_view(request, *args, **kwargs):
+        if (
+            not settings.PAGE_CACHE_SETINGS['ENABLED']
+            or request.method not in ('GET', 'HEAD')
+        ):
+            return view(request, *args, **kwargs)
+        if not is_anonymous(request):
+            response = view(request, *args, **kwargs)
+            patch_cache_control(response, private=True)
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        response = _from_cache(request)
+        if response is not None:
+            return response
+        request.page_cache_tags = set()
+        started = request_started()
+        with collect_stale() as stale:
+            response = view(request, *args, **kwargs)
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=settings.PAGE_CACHE_SETINGS['MAX_AGE'],
+        )
+        patch_vary_headers(response, ('Cookie',))
+        # Страница с CSRF-токеном или cookie принадлежит одному
+        # посетителю, её нельзя отдавать остальным. Страницу из
+        # устаревших фрагментов (core.stampede) не сохраняем вовсе.
+        if (
+            response.status_code == 200
+            and not response.cookies
+            and not request.META.get('CSRF_COOKIE_USED')
+            and not stale
+        ):
+            remember(request.page_cache_tags)
+            cache.set(
+                _page_key(request),
+                (started, request.page_cache_tags, response),
+                settings.PAGE_CACHE_SETINGS['TIMEOUT'],
+            )
+        return response
+    return wrapped_view
@@ -0,0 +1,174 @@
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Max, Min, Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+FORWARD = 'n'
+BACKWARD = 'p'
+
+
+def encode_cursor(obj, direction, key=('pub_date', 'id')):
+    """Упаковывает ключ (pub_date, id) записи в непрозрачный токен."""
+    date_field, id_field = key
+    raw = (
+        f'{direction}|{getattr(obj, date_field).isoformat()}'
+        f'|{getattr(obj, id_field)}'
+    )
+    return urlsafe_base64_encode(force_bytes(raw))
+
+
+def decode_cursor(token):
+    """Возвращает (direction, pub_date, id) или None для битого токена."""
+    try:
+        direction, pub_date, pk = (
+            urlsafe_base64_decode(token).decode().split('|')
+        )
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        return None
+    if direction not in (FORWARD, BACKWARD) or pub_date is None:
+        return None
+    return direction, pub_date, pk
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинатор по паре (pub_date, id).
+
+    Страница по курсору выбирается одним запросом с LIMIT без OFFSET
+    и без COUNT(*), поэтому её стоимость не зависит от глубины ленты.
+    Обычный get_page() по номеру страницы оставлен для старых ссылок.
+    Ключ можно переопределить, например ('pub_date', 'post_id') для
+    таблиц, где дата поста денормализована.
+    """
+
+    def __init__(self, object_list, per_page, key=('pub_date', 'id'),
+                 **kwargs):
+        self.key = key
+        super().__init__(
+            object_list.order_by(*(f'-{field}' for field in key)),
+            per_page,
+            **kwargs
+        )
+
+    def get_cursor_page(self, cursor=None):
+        """Возвращает страницу, следующую за курсором (или перед ним).
+
+        У такой страницы нет номера: вместо него заполнены атрибуты
+        next_cursor и previous_cursor.
+        """
+        key = decode_cursor(cursor) if cursor else None
+        if key is None:
+            items, has_more = self._fetch(self.object_list)
+            return self._get_cursor_page(items, None, has_more)
+        direction, pub_date, pk = key
+        if direction == FORWARD:
+            items, has_more = self._fetch(
+                self.object_list.filter(self._seek('lt', pub_date, pk))
+            )
+            return self._get_cursor_page(items, bool(items), has_more)
+        items, has_more = self._fetch(
+            self.object_list.filter(self._seek('gt', pub_date, pk)).reverse()
+        )
+        items.reverse()
+        return self._get_cursor_page(items, has_more, bool(items))
+
+    def _seek(self, lookup, pub_date, pk):
+        date_field, id_field = self.key
+        return (
+            Q(**{f'{date_field}__{lookup}': pub_date})
+            | Q(**{date_field: pub_date, f'{id_field}__{lookup}': pk})
+        )
+
+    def _fetch(self, queryset):
+        items = list(queryset[:self.per_page + 1])
+        has_more = len(items) > self.per_page
+        return items[:self.per_page], has_more
+
+    def _get_cursor_page(self, items, has_previous, has_next):
+        page = self._get_page(items, None, self)
+        page.previous_cursor = (
+            encode_cursor(items[0], BACKWARD, self.key)
+            if has_previous else None
+        )
+        page.next_cursor = (
+            encode_cursor(items[-1], FORWARD, self.key)
+            if has_next else None
+        )
+        return page
+
+
+def estimate_count(queryset):
+    """Оценка числа строк без COUNT(*) или None, если оценить нельзя.
+
+    Оценивается только вся таблица, без фильтров: разница между
+    крайними id читается по первичному ключу за два шага по индексу.
+    Удалённые строки оценку завышают.
+    """
+    if queryset.query.where:
+        return None
+    bounds = queryset.model._default_manager.using(queryset.db).aggregate(
+        first=Min('pk'), last=Max('pk')
+    )
+    if bounds['last'] is None:
+        return 0
+    return bounds['last'] - bounds['first'] + 1
+
+
+class FeedPaginator(CursorPaginator):
+    """Пагинатор лент: курсоры, окно номеров страниц и кэш COUNT(*).
+
+    Число записей ленты хранится в кэше под count_key, пока его не
+    сбросит сигнал о новом или удалённом посте. Если вся таблица
+    больше estimate_above строк, вместо COUNT(*) берётся оценка.
+    У страницы, полученной get_page(), есть page_window — номера
+    страниц вокруг текущей, где None означает пропуск.
+    """
+
+    def __init__(self, object_list, per_page, count_key=None,
+                 count_timeout=None, estimate_above=None, window=2,
+                 **kwargs):
+        self.count_key = count_key
+        self.count_timeout = count_timeout
+        self.estimate_above = estimate_above
+        self.window = window
+        super().__init__(object_list, per_page, **kwargs)
+
+    @cached_property
+    def count(self):
+        if self.count_key is None:
+            return self._count()
+        count = cache.get(self.count_key)
+        if count is None:
+            count = self._count()
+            cache.set(self.count_key, count, self.count_timeout)
+        return count
+
+    def _count(self):
+        if self.estimate_above is not None:
+            estimate = estimate_count(self.object_list)
+            if estimate is not None and estimate > self.estimate_above:
+                return estimate
+        return self.object_list.count()
+
+    def page_window(self, number):
+        """Например, [1, None, 4, 5, 6, 7, 8, None, 120] для 6-й."""
+        start = max(number - self.window, 1)
+        end = min(number + self.window, self.num_pages)
+        pages = list(range(start, end + 1))
+        if start > 1:
+            pages[:0] = [1, None] if start > 2 else [1]
+        if end < self.num_pages:
+            pages += (
+                [None, self.num_pages] if end < self.num_pages - 1
+                else [self.num_pages]
+            )
+        return pages
+
+    def get_page(self, number):
+        page = super().get_page(number)
+        page.page_window = self.page_window(page.number)
+        return page
@@ -0,0 +1,106 @@
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.urls import resolve
+
+
+class QueryBudgetExceeded(Exception):
+    """Представление сделало больше SQL-запросов, чем ему разрешено."""
+
+
+def query_budget(limit):
+    """Декоратор: сколько SQL-запросов может сделать представление.
+
+    Бюджет из QUERY_BUDGET_SETINGS['VIEWS'] по имени маршрута
+    важнее декоратора.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapped_view(*args, **kwargs):
+            return view_func(*args, **kwargs)
+        wrapped_view.query_budget = limit
+        return wrapped_view
+    return decorator
+
+
+def get_budget(resolver_match):
+    """Бюджет для найденного маршрута или None, если он не задан."""
+    views = settings.QUERY_BUDGET_SETINGS['VIEWS']
+    if resolver_match.view_name in views:
+        return views[resolver_match.view_name]
+    return getattr(
+        resolver_match.func,
+        'query_budget',
+        settings.QUERY_BUDGET_SETINGS['DEFAULT'],
+    )
+
+
+# Управление транзакцией — не запрос за данными, в бюджет не входит.
+TRANSACTION_STATEMENTS = ('BEGIN', 'SAVEPOINT', 'RELEASE', 'ROLLBACK')
+
+
+@contextmanager
+def count_queries():
+    """Собирает SQL всех подключений в список, без DEBUG."""
+    queries = []
+
+    def wrapper(execute, sql, params, many, context):
+        if not sql.lstrip().upper().startswith(TRANSACTION_STATEMENTS):
+            queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(wrapper))
+        yield queries
+
+
+def format_overrun(view_name, budget, queries):
+    return '{}: {} запросов при бюджете {}:\n{}'.format(
+        view_name, len(queries), budget, '\n'.join(queries)
+    )
+
+
+class QueryBudgetMiddleware:
+    """Падает, если представление вышло за бюджет запросов.
+
+    Работает только при QUERY_BUDGET_SETINGS['ENABLED'] — то есть
+    в разработке; в тестах то же проверяет QueryBudgetMixin.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_BUDGET_SETINGS['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with count_queries() as queries:
+            response = self.get_response(request)
+        match = request.resolver_match
+        budget = get_budget(match) if match else None
+        if budget is not None and len(queries) > budget:
+            raise QueryBudgetExceeded(
+                format_overrun(match.view_name, budget, queries)
+            )
+        return response
+
+
+class QueryBudgetMixin:
+    """Проверка бюджета запросов для TestCase."""
+
+    def assertQueryBudget(self, url, data=None, method='get', client=None,
+                          **extra):
+        client = client or self.client
+        match = resolve(urlsplit(url).path)
+        budget = get_budget(match)
+        with count_queries() as queries:
+            response = getattr(client, method)(url, data, **extra)
+        if budget is None:
+            self.fail(f'У {match.view_name} не задан бюджет запросов')
+        if len(queries) > budget:
+            self.fail(format_overrun(match.view_name, budget, queries))
+        return response
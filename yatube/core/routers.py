@@ -0,0 +1,106 @@
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Состояние текущего запроса: можно ли читать с реплики и была ли
+# запись. Словарь изменяемый, поэтому запись из core.writer, которая
+# выполняется в копии контекста запроса, отмечается и здесь.
+_state = ContextVar('replica_state', default=None)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def replica_alias():
+    """Алиас реплики, если она включена и описана в DATABASES."""
+    alias = settings.REPLICA_SETINGS['ALIAS']
+    if settings.REPLICA_SETINGS['ENABLED'] and alias in settings.DATABASES:
+        return alias
+    return None
+
+
+def replica_lag():
+    """На сколько секунд могут отставать данные текущего запроса.
+
+    REPLICA_SETINGS['MAX_LAG'], если запросу разрешено читать с
+    реплики, иначе 0.
+    """
+    state = _state.get()
+    if state is not None and state['replica']:
+        return settings.REPLICA_SETINGS['MAX_LAG']
+    return 0
+
+
+class ReplicaRouter:
+    """Чтения лент, профиля и поста — с реплики, всё остальное — с основной.
+
+    Реплика используется, только если ReplicaMiddleware разрешила её
+    для запроса и в этом запросе ещё не было записи.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if (
+            state is not None
+            and state['replica']
+            and not state['wrote']
+            and model._meta.app_label in settings.REPLICA_SETINGS['APPS']
+        ):
+            return replica_alias() or DEFAULT_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state['wrote'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика — копия основной базы, объекты из них совместимы.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db == settings.REPLICA_SETINGS['ALIAS']:
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    """Включает реплику для чтений из REPLICA_SETINGS['VIEWS'].
+
+    Read-your-writes: после записи (или любого не-GET запроса)
+    ставится cookie, и ещё STICKY_SECONDS секунд этот браузер читает
+    только с основной базы, пока реплика не догнала его запись.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if replica_alias() is None:
+            return self.get_response(request)
+        state = {'replica': False, 'wrote': False}
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state['wrote'] or request.method not in SAFE_METHODS:
+            response.set_cookie(
+                settings.REPLICA_SETINGS['COOKIE'],
+                '1',
+                max_age=settings.REPLICA_SETINGS['STICKY_SECONDS'],
+                httponly=True,
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = _state.get()
+        if state is None:
+            return
+        state['replica'] = (
+            request.method in SAFE_METHODS
+            and settings.REPLICA_SETINGS['COOKIE'] not in request.COOKIES
+            and request.resolver_match.view_name
+            in settings.REPLICA_SETINGS['VIEWS']
+        )
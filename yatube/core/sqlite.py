@@ -0,0 +1,43 @@
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_reported = set()
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    """Обработчик connection_created: PRAGMA из SQLITE_SETINGS.
+
+    При первом подключении процесса к базе пишет в лог, какие
+    значения SQLite реально принял: journal_mode=wal, например,
+    молча не включится на базе в памяти.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    # Сырой курсор sqlite3: PRAGMA не попадают в execute_wrapper
+    # и не считаются запросами запроса, открывшего подключение.
+    for name, value in settings.SQLITE_SETINGS['PRAGMAS'].items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+    if connection.alias not in _reported:
+        _reported.add(connection.alias)
+        logger.info(
+            'SQLite %s (%s): %s',
+            connection.alias,
+            connection.settings_dict['NAME'],
+            ', '.join(
+                f'{name}={value}'
+                for name, value in active_pragmas(connection).items()
+            ),
+        )
+
+
+def active_pragmas(connection):
+    """Текущие значения PRAGMA из настроек для подключения."""
+    connection.ensure_connection()
+    values = {}
+    for name in settings.SQLITE_SETINGS['PRAGMAS']:
+        row = connection.connection.execute(f'PRAGMA {name}').fetchone()
+        values[name] = row[0] if row else None
+    return values
@@ -0,0 +1,94 @@
+import math
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache as default_cache
+
+from .cache_tags import (collect_stale, is_fresh, remember, request_started,
+                         served_stale)
+
+LOCK_KEY = '{key}:lock'
+
+
+def _outdated(entry, version, tags):
+    """Устарела ли запись: другая версия, сброшенный тег или срок."""
+    _, stored_version, expires, _, started = entry
+    return (
+        stored_version != version
+        or not is_fresh(tags, started)
+        or expires is not None and expires <= time.time()
+    )
+
+
+def _fresh(entry, version, tags):
+    """Свежа ли запись с учётом вероятностного раннего обновления.
+
+    XFetch: чем ближе срок и чем дольше пересчёт (delta), тем выше
+    шанс, что запрос решит обновить запись заранее. Пересчёты
+    размазываются по времени, а не сходятся в момент истечения.
+    """
+    if _outdated(entry, version, tags):
+        return False
+    expires, delta = entry[2], entry[3]
+    if expires is None:
+        return True
+    beta = settings.STAMPEDE_SETINGS['BETA']
+    return time.time() - delta * beta * math.log(1 - random.random()) < expires
+
+
+def get_or_set(key, compute, timeout, version=None, tags=(), cache=None):
+    """Значение из кэша; пересчитывает его только один процесс.
+
+    В кэше лежит (значение, version, срок, время пересчёта, начало
+    запроса) на STALE_TIMEOUT секунд дольше срока. Запись истёкшую,
+    другой версии или с тегом, сброшенным после начала запроса (см.
+    core.cache_tags), пересчитывает тот, кто первым взял блокировку,
+    а остальные тем временем отдают старое значение. Если старого нет, они ждут
+    до WAIT секунд и лишь затем считают сами, ничего не сохраняя.
+
+    Отданное устаревшее значение отмечается через served_stale(), и
+    объемлющие get_or_set и страницы не сохраняются свежими: значение,
+    собранное из устаревших, записывается сразу истёкшим.
+    """
+    cache = cache or default_cache
+    options = settings.STAMPEDE_SETINGS
+    entry = cache.get(key)
+    if entry is not None and _fresh(entry, version, tags):
+        return entry[0]
+    lock = LOCK_KEY.format(key=key)
+    if cache.add(lock, 1, options['LOCK_TIMEOUT']):
+        try:
+            started = request_started()
+            computing = time.perf_counter()
+            with collect_stale() as stale:
+                value = compute()
+            delta = time.perf_counter() - computing
+            if stale:
+                # Остаётся запасным значением на время пересчёта, но
+                # следующий запрос пересоберёт его.
+                expires = time.time()
+            else:
+                expires = None if timeout is None else time.time() + timeout
+            remember(tags)
+            cache.set(
+                key,
+                (value, version, expires, delta, started),
+                None if timeout is None
+                else timeout + options['STALE_TIMEOUT'],
+            )
+        finally:
+            cache.delete(lock)
+        return value
+    if entry is None:
+        deadline = time.monotonic() + options['WAIT']
+        while time.monotonic() < deadline:
+            time.sleep(options['POLL'])
+            entry = cache.get(key)
+            if entry is not None and entry[1] == version:
+                break
+        else:
+            return compute()
+    if _outdated(entry, version, tags):
+        served_stale()
+    return entry[0]
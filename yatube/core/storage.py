@@ -0,0 +1,39 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+def file_digest(content):
+    """SHA-256 содержимого файла; позиция чтения возвращается в начало."""
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит файл под именем из хеша содержимого.
+
+    Повторная загрузка той же картинки не пишет новый файл, а
+    возвращает имя уже сохранённого: диск и миниатюры (их ключ —
+    имя исходника) расходуются на такую картинку один раз.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        directory, filename = os.path.split(name)
+        digest = file_digest(content)
+        name = os.path.join(
+            directory,
+            digest[:2],
+            digest + os.path.splitext(filename)[1].lower(),
+        )
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
@@ -0,0 +1,20 @@
+from django.template.backends.django import DjangoTemplates as BaseBackend
+from django.template.backends.django import Template as BaseTemplate
+
+from .timing import timed
+
+
+class Template(BaseTemplate):
+    def render(self, context=None, request=None):
+        with timed('template_time'):
+            return super().render(context, request)
+
+
+class DjangoTemplates(BaseBackend):
+    """Обычный бэкенд шаблонов Django с замером времени рендеринга."""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name).template, self)
@@ -0,0 +1,106 @@
+from django import template
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.templatetags.cache import CacheNode
+
+from core.stampede import get_or_set
+
+register = template.Library()
+
+
+class StampedeCacheNode(CacheNode):
+    def __init__(self, *args, version=None, tags=None):
+        super().__init__(*args)
+        self.version = version
+        self.tags = tags
+
+    def _resolve(self, var, context):
+        try:
+            return var.resolve(context)
+        except template.VariableDoesNotExist:
+            raise template.TemplateSyntaxError(
+                f'"cache" tag got an unknown variable: {var.var!r}'
+            )
+
+    def _cache(self, context):
+        if self.cache_name:
+            name = self._resolve(self.cache_name, context)
+            try:
+                return caches[name]
+            except InvalidCacheBackendError:
+                raise template.TemplateSyntaxError(
+                    f'Invalid cache name specified for cache tag: {name!r}'
+                )
+        try:
+            return caches['template_fragments']
+        except InvalidCacheBackendError:
+            return caches['default']
+
+    def _tags(self, context):
+        if not self.tags:
+            return ()
+        tags = self._resolve(self.tags, context)
+        return tags.split() if isinstance(tags, str) else tags
+
+    def render(self, context):
+        expire_time = self._resolve(self.expire_time_var, context)
+        if expire_time is not None:
+            try:
+                expire_time = int(expire_time)
+            except (ValueError, TypeError):
+                raise template.TemplateSyntaxError(
+                    f'"cache" tag got a non-integer timeout value: '
+                    f'{expire_time!r}'
+                )
+        key = make_template_fragment_key(
+            self.fragment_name,
+            [var.resolve(context) for var in self.vary_on],
+        )
+        return get_or_set(
+            key,
+            lambda: self.nodelist.render(context),
+            expire_time,
+            version=(
+                self._resolve(self.version, context) if self.version
+                else None
+            ),
+            tags=self._tags(context),
+            cache=self._cache(context),
+        )
+
+
+@register.tag('cache')
+def do_cache(parser, token):
+    """{% cache %} из django.templatetags.cache с защитой от давки.
+
+    Синтаксис тот же, плюс необязательные version= и tags= (строка
+    тегов через пробел или список, см. core.cache_tags). При смене
+    версии или поколения тега ключ остаётся прежним, и пока один
+    запрос перестраивает фрагмент, остальные отдают старый
+    (см. core.stampede.get_or_set)::
+
+        {% load stampede %}
+        {% cache 3600 group_header group.pk tags=header_tags %}
+    """
+    nodelist = parser.parse(('endcache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    options = {}
+    while len(tokens) > 3 and tokens[-1].split('=', 1)[0] in (
+        'using', 'version', 'tags'
+    ):
+        name, value = tokens.pop().split('=', 1)
+        options[name] = parser.compile_filter(value)
+    if len(tokens) < 3:
+        raise template.TemplateSyntaxError(
+            f'{tokens[0]!r} tag requires at least 2 arguments.'
+        )
+    return StampedeCacheNode(
+        nodelist,
+        parser.compile_filter(tokens[1]),
+        tokens[2],
+        [parser.compile_filter(token) for token in tokens[3:]],
+        options.get('using'),
+        version=options.get('version'),
+        tags=options.get('tags'),
+    )
@@ -0,0 +1,182 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from unittest import mock
+
+from django.core.cache import cache
+from django.template import Context, Template
+from django.test import TestCase
+
+from core.cache import SQLiteCache
+from core.stampede import LOCK_KEY, get_or_set
+
+
+class SQLiteCacheTest(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'cache.sqlite3')
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.path, {'OPTIONS': options})
+
+    def test_shared_between_instances(self):
+        """Запись и сброс одного экземпляра видны другому."""
+        first, second = self.make_cache(), self.make_cache()
+        first.set_many({'page': {'html': '<p>'}, 'count': 3})
+        self.assertEqual(
+            second.get_many(['page', 'count', 'missing']),
+            {'page': {'html': '<p>'}, 'count': 3},
+        )
+        second.delete('page')
+        self.assertIsNone(first.get('page'))
+
+    def test_incr_and_add(self):
+        """incr атомарен и общий, add не затирает живое значение."""
+        first, second = self.make_cache(), self.make_cache()
+        with self.assertRaises(ValueError):
+            first.incr('version')
+        self.assertTrue(first.add('version', 1))
+        self.assertFalse(second.add('version', 100))
+        for _ in range(5):
+            first.incr('version')
+            second.incr('version')
+        self.assertEqual(first.get('version'), 11)
+        self.assertEqual(second.decr('version', 10), 1)
+
+    def test_expiry(self):
+        """Просроченное значение не читается и заменяется add."""
+        cache = self.make_cache()
+        cache.set('key', 'old', 0.05)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('key'))
+        self.assertTrue(cache.add('key', 'new'))
+        self.assertEqual(cache.get('key'), 'new')
+
+    def test_lru_eviction(self):
+        """Сверх MAX_ENTRIES вытесняются давно не читанные ключи."""
+        cache = self.make_cache(MAX_ENTRIES=10, CULL_FREQUENCY=2)
+        cache.TOUCH_INTERVAL = 0
+        cache.CULL_EVERY = 1
+        for i in range(10):
+            cache.set(f'key:{i}', i)
+        cache.get('key:0')
+        cache.set('key:10', 10)
+        self.assertEqual(cache.get('key:0'), 0)
+        self.assertIsNone(cache.get('key:1'))
+        self.assertEqual(len(cache.get_many(
+            [f'key:{i}' for i in range(11)]
+        )), 6)
+
+    def test_cull_every_nth_write(self):
+        """Размер проверяется не на каждой записи, а раз в CULL_EVERY."""
+        cache = self.make_cache(MAX_ENTRIES=2, CULL_FREQUENCY=0)
+        cache.CULL_EVERY = 5
+        for i in range(4):
+            cache.set(f'key:{i}', i)
+        self.assertEqual(len(cache.get_many(
+            [f'key:{i}' for i in range(5)]
+        )), 4)
+        cache.set('key:4', 4)
+        self.assertEqual(cache.get_many(
+            [f'key:{i}' for i in range(5)]
+        ), {})
+
+    def test_incr_without_returning(self):
+        """На SQLite до 3.35 incr обходится без RETURNING."""
+        cache = self.make_cache()
+        with mock.patch('core.cache.HAS_RETURNING', False):
+            with self.assertRaises(ValueError):
+                cache.incr('version')
+            cache.set('version', 1)
+            self.assertEqual(cache.incr('version', 4), 5)
+            self.assertEqual(cache.decr('version'), 4)
+        self.assertEqual(cache.get('version'), 4)
+
+
+class StampedeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.computed = 0
+
+    def compute(self, value='новое', pause=0):
+        time.sleep(pause)
+        self.computed += 1
+        return value
+
+    def test_single_flight(self):
+        """Пустой ключ пересчитывает один поток, остальные ждут его"""
+        barrier = threading.Barrier(8)
+        results = []
+
+        def worker():
+            barrier.wait()
+            results.append(get_or_set('key', lambda: self.compute(
+                pause=0.1
+            ), 60))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.computed, 1)
+        self.assertEqual(results, ['новое'] * 8)
+
+    def test_stale_while_rebuilding(self):
+        """Пока другой процесс пересчитывает, отдаётся старая версия"""
+        get_or_set('key', lambda: self.compute('старое'), 60, version=1)
+        cache.add(LOCK_KEY.format(key='key'), 1)
+        self.assertEqual(
+            get_or_set('key', self.compute, 60, version=2), 'старое'
+        )
+        cache.delete(LOCK_KEY.format(key='key'))
+        self.assertEqual(
+            get_or_set('key', self.compute, 60, version=2), 'новое'
+        )
+        self.assertEqual(self.computed, 2)
+
+    def test_stale_inner_value_outdates_outer(self):
+        """Значение из устаревшего вложенного не сохраняется свежим"""
+        def outer(text):
+            return get_or_set(
+                'outer', lambda: get_or_set(
+                    'inner', lambda: self.compute(text), 60, version=text,
+                ), 60,
+            )
+
+        self.assertEqual(outer('старое'), 'старое')
+        cache.delete('outer')
+        cache.add(LOCK_KEY.format(key='inner'), 1)
+        self.assertEqual(outer('новое'), 'старое')
+        cache.delete(LOCK_KEY.format(key='inner'))
+        self.assertEqual(outer('новое'), 'новое')
+        self.assertEqual(self.computed, 2)
+
+    def test_early_refresh(self):
+        """Долгий пересчёт обновляется раньше срока, быстрый — нет"""
+        expires = time.time() + 10
+        with mock.patch('core.stampede.random.random', return_value=0.5):
+            cache.set('key', ('старое', None, expires, 1, time.time()))
+            self.assertEqual(get_or_set('key', self.compute, 60), 'старое')
+            cache.set('key', ('старое', None, expires, 100, time.time()))
+            self.assertEqual(get_or_set('key', self.compute, 60), 'новое')
+
+    def test_template_tag(self):
+        """{% cache %} из stampede обновляет фрагмент при смене версии"""
+        template = Template(
+            '{% load stampede %}'
+            '{% cache 60 fragment page version=version %}'
+            '{{ text }}{% endcache %}'
+        )
+
+        def render(**context):
+            return template.render(Context(context))
+
+        self.assertEqual(render(page=1, version=1, text='а'), 'а')
+        self.assertEqual(render(page=1, version=1, text='б'), 'а')
+        self.assertEqual(render(page=2, version=1, text='б'), 'б')
+        self.assertEqual(render(page=1, version=2, text='в'), 'в')
@@ -0,0 +1,97 @@
+import os
+import shutil
+import tempfile
+
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.metrics import SharedCounters, render
+from posts.models import Post
+
+User = get_user_model()
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='StasBasov')
+        Post.objects.create(text='Тестовый текст', author=cls.user)
+
+    @override_settings(METRICS_SETINGS={
+        **settings.METRICS_SETINGS, 'ALLOWED_IPS': ('127.0.0.1',),
+    })
+    def test_metrics_endpoint(self):
+        """/metrics отдаёт гистограммы по маршрутам и глубину очередей"""
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        for line in (
+            '# TYPE yatube_request_duration_seconds histogram',
+            'yatube_request_duration_seconds_bucket{view="posts:index",'
+            'le="+Inf"}',
+            'yatube_requests_total{view="posts:index"}',
+            'yatube_db_queries_total{view="posts:index"}',
+            'yatube_cache_hit_ratio{cache="default"}',
+            'yatube_thumbnail_queue_depth 0.0',
+            'yatube_writer_queue_depth 0.0',
+        ):
+            self.assertIn(line, text)
+
+    @override_settings(METRICS_SETINGS={
+        **settings.METRICS_SETINGS, 'TOKEN': 'secret',
+    })
+    def test_metrics_guarded(self):
+        """/metrics доступен только с токеном, даже с localhost"""
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(
+            self.client.get(
+                url, HTTP_AUTHORIZATION='Bearer wrong'
+            ).status_code,
+            404,
+        )
+        self.assertEqual(
+            self.client.get(
+                url, REMOTE_ADDR='10.0.0.1',
+                HTTP_AUTHORIZATION='Bearer secret',
+            ).status_code,
+            200,
+        )
+
+    def test_dead_workers_free_slots(self):
+        """Ключи очередей умерших воркеров освобождают слоты"""
+        store = SharedCounters(None, 4)
+        store.update(replace={
+            f'yatube_writer_queue_depth|pid="{pid}"': 1 for pid in range(4)
+        })
+        store.update({'yatube_requests_total|view="a"': 1})
+        self.assertEqual(len(store.items()), 4)
+        with mock.patch('core.metrics.get_store', return_value=store), \
+                mock.patch('core.metrics._alive', lambda pid: pid == 0):
+            render()
+        store.update({'yatube_requests_total|view="a"': 1})
+        self.assertEqual(dict(store.items()), {
+            'yatube_writer_queue_depth|pid="0"': 1,
+            'yatube_requests_total|view="a"': 1,
+        })
+
+    def test_counters_shared_through_file(self):
+        """Счётчики двух процессов складываются в общем файле"""
+        path = os.path.join(tempfile.mkdtemp(), 'metrics.mmap')
+        try:
+            first = SharedCounters(path, 64)
+            second = SharedCounters(path, 64)
+            first.update({'requests|view="a"': 2})
+            second.update({'requests|view="a"': 3, 'requests|view="b"': 1})
+            self.assertEqual(
+                dict(first.items()),
+                {'requests|view="a"': 5, 'requests|view="b"': 1},
+            )
+        finally:
+            shutil.rmtree(os.path.dirname(path), ignore_errors=True)
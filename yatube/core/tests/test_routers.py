@@ -0,0 +1,70 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import routers
+from core.cache_tags import invalidate, is_fresh, request_started
+from core.routers import ReplicaRouter
+from posts.models import Post
+
+User = get_user_model()
+
+
+@override_settings(
+    REPLICA_SETINGS={**settings.REPLICA_SETINGS, 'ENABLED': True},
+    DATABASES={**settings.DATABASES, 'replica': settings.DATABASES['default']},
+)
+class ReplicaRouterTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='StasBasov')
+        cls.post = Post.objects.create(text='Тестовый текст', author=cls.user)
+
+    def test_router(self):
+        """Чтения постов идут в реплику до первой записи в запросе"""
+        router = ReplicaRouter()
+        state = {'replica': True, 'wrote': False}
+        token = routers._state.set(state)
+        try:
+            self.assertEqual(router.db_for_read(Post), 'replica')
+            self.assertEqual(router.db_for_read(User), 'default')
+            self.assertEqual(router.db_for_write(Post), 'default')
+            self.assertEqual(router.db_for_read(Post), 'default')
+        finally:
+            routers._state.reset(token)
+        self.assertEqual(router.db_for_read(Post), 'default')
+        self.assertFalse(router.allow_migrate('replica', 'posts'))
+
+    def test_replica_reads_cached_as_older(self):
+        """Кэш по данным реплики не переживает сброс в пределах её лага"""
+        invalidate('post:replica')
+        token = routers._state.set({'replica': True, 'wrote': False})
+        try:
+            started = request_started()
+        finally:
+            routers._state.reset(token)
+        self.assertLess(
+            started,
+            time.time() - settings.REPLICA_SETINGS['MAX_LAG'] + 1,
+        )
+        self.assertFalse(is_fresh({'post:replica'}, started))
+        self.assertTrue(is_fresh({'post:replica'}, request_started()))
+
+    def test_sticky_after_write(self):
+        """После записи браузер получает cookie чтения с основной базы"""
+        client = Client()
+        client.force_login(self.user)
+        response = client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Комментарий'},
+        )
+        cookie = settings.REPLICA_SETINGS['COOKIE']
+        self.assertIn(cookie, response.cookies)
+        self.assertEqual(
+            response.cookies[cookie]['max-age'],
+            settings.REPLICA_SETINGS['STICKY_SECONDS'],
+        )
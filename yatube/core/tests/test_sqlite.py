@@ -0,0 +1,16 @@
+from django.db import connection
+from django.test import TestCase
+
+from core.sqlite import active_pragmas
+
+
+class SqlitePragmasTest(TestCase):
+    def test_pragmas_applied(self):
+        """PRAGMA из SQLITE_SETINGS применяются к подключению."""
+        if connection.vendor != 'sqlite':
+            self.skipTest('Только для SQLite')
+        pragmas = active_pragmas(connection)
+        self.assertEqual(pragmas['synchronous'], 1)
+        self.assertEqual(pragmas['busy_timeout'], 5000)
+        self.assertEqual(pragmas['temp_store'], 2)
+        self.assertEqual(pragmas['cache_size'], -64 * 1024)
@@ -0,0 +1,54 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.timing import aggregator
+from posts.models import Post
+
+User = get_user_model()
+
+
+class ServerTimingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='StasBasov')
+        Post.objects.create(text='Тестовый текст', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        aggregator.reset()
+
+    def test_server_timing_header(self):
+        """Ответ несёт Server-Timing, замеры копятся по имени маршрута"""
+        response = self.client.get(reverse('posts:index'))
+        header = response['Server-Timing']
+        for name in ('db;', 'tpl;', 'cache;', 'thumb;', 'total;'):
+            self.assertIn(name, header)
+        self.client.get(reverse('posts:index'))
+        stats = aggregator.snapshot()['posts:index']
+        self.assertEqual(stats['requests'], 2)
+        self.assertGreater(stats['db_queries'], 0)
+        self.assertGreater(stats['template_time'], 0)
+        self.assertGreater(stats['cache_hits'], 0)
+        self.assertGreater(stats['cache_misses'], 0)
+
+    @override_settings(TIMING_SETINGS={'HEADER': True, 'ALLOWED_IPS': ()})
+    def test_server_timing_staff_only(self):
+        """Вне доверенных адресов Server-Timing видит только персонал"""
+        url = reverse('posts:index')
+        self.assertNotIn('Server-Timing', self.client.get(url))
+        self.client.force_login(self.user)
+        self.assertNotIn('Server-Timing', self.client.get(url))
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        self.assertIn('Server-Timing', self.client.get(url))
+
+    @override_settings(TIMING_SETINGS={
+        'HEADER': False, 'ALLOWED_IPS': ('127.0.0.1',),
+    })
+    def test_server_timing_disabled(self):
+        """Без HEADER заголовка нет ни у кого"""
+        self.assertNotIn(
+            'Server-Timing', self.client.get(reverse('posts:index'))
+        )
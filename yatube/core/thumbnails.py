@@ -0,0 +1,244 @@
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.dispatch import Signal
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from .timing import timed
+
+logger = logging.getLogger(__name__)
+
+# Создана новая миниатюра: name — имя исходной картинки в хранилище.
+thumbnail_ready = Signal()
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_SETINGS['WORKERS'],
+                thread_name_prefix='thumbnails',
+            )
+    return _executor
+
+
+def pending_count():
+    """Сколько миниатюр сейчас ждёт генерации в пуле."""
+    return len(_pending)
+
+
+def _job_key(name, geometry_string, options):
+    return name, geometry_string, tuple(sorted(options.items()))
+
+
+def _run(key, source, geometry_string, options):
+    backend = default.backend
+    try:
+        with timed('thumbnail_time'):
+            # Миниатюру мог уже создать другой процесс или задача:
+            # страницы с ней тогда сбрасывать незачем.
+            if default.kvstore.get(
+                backend.thumbnail_file(source, geometry_string, options)
+            ):
+                return
+            backend.generate(source, geometry_string, **options)
+    except Exception:
+        logger.exception('Не удалось создать миниатюру %s', source.name)
+    else:
+        thumbnail_ready.send(sender=None, name=source.name)
+    finally:
+        with _lock:
+            _pending.discard(key)
+
+
+def _run_in_pool(*args):
+    try:
+        _run(*args)
+    finally:
+        connection.close()
+
+
+def schedule(file_, geometry_string, **options):
+    """Ставит миниатюру в очередь пула после коммита транзакции.
+
+    file_ — файл картинки вместе с его хранилищем: хранилище входит
+    в ключ миниатюры, и по одному имени её потом не найти.
+    При WORKERS = 0 миниатюра создаётся сразу, в том же потоке.
+
+    Одна и та же миниатюра не ставится дважды, пока первая задача
+    не завершилась, — параллельные запросы не гоняются за ней.
+    """
+    source = ImageFile(file_.name, file_.storage)
+    key = _job_key(source.name, geometry_string, options)
+
+    def submit():
+        with _lock:
+            if key in _pending:
+                return
+            _pending.add(key)
+        if settings.THUMBNAIL_SETINGS['WORKERS']:
+            get_executor().submit(
+                _run_in_pool, key, source, geometry_string, options
+            )
+        else:
+            _run(key, source, geometry_string, options)
+
+    transaction.on_commit(submit)
+
+
+class LRUCache:
+    """Небольшой потокобезопасный LRU-словарь в памяти процесса."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_urls = LRUCache(settings.THUMBNAIL_SETINGS['LRU_SIZE'])
+
+
+def _lookup_many(keys):
+    """Значения kvstore по ключам: один get_many и один запрос в БД."""
+    kvstore = default.kvstore
+    if not isinstance(kvstore, KVStore):
+        return {key: kvstore._get_raw(key) for key in keys}
+    found = {
+        key: value for key, value in kvstore.cache.get_many(keys).items()
+        if isinstance(value, str)
+    }
+    missing = [key for key in keys if key not in found]
+    if missing:
+        from_db = dict(
+            KVStoreModel.objects.filter(key__in=missing).values_list(
+                'key', 'value'
+            )
+        )
+        if from_db:
+            kvstore.cache.set_many(
+                from_db, sorl_settings.THUMBNAIL_CACHE_TIMEOUT
+            )
+        found.update(from_db)
+    return found
+
+
+def thumbnail_urls(files, geometry_string, **options):
+    """Возвращает {имя исходника: url} для пачки картинок разом.
+
+    Готовые миниатюры ищутся в LRU процесса, затем одним multi-get
+    в kvstore. Для ещё не готовых ставится задача в пул, а вместо
+    миниатюры отдаётся url оригинала.
+    """
+    backend = default.backend
+    urls = {}
+    keys = {}
+    for file_ in files:
+        source = ImageFile(file_)
+        thumbnail = backend.thumbnail_file(source, geometry_string, options)
+        key = add_prefix(thumbnail.key)
+        url = _urls.get(key)
+        if url is not None:
+            urls[source.name] = url
+        else:
+            keys[key] = source
+    for key, value in _lookup_many(list(keys)).items():
+        if value:
+            url = deserialize_image_file(value).url
+            _urls.set(key, url)
+            urls[keys[key].name] = url
+    for source in keys.values():
+        if source.name not in urls:
+            schedule(source, geometry_string, **options)
+            urls[source.name] = source.url
+    return urls
+
+
+def schedule_post(post):
+    """Ставит в очередь все размеры из настроек для картинки поста."""
+    if not post.image:
+        return
+    sizes = settings.THUMBNAIL_SETINGS['SIZES']
+    for geometry_string, options in sizes.values():
+        schedule(post.image, geometry_string, **options)
+
+
+class BackgroundThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl-thumbnail, который не режет картинки внутри запроса.
+
+    Готовая миниатюра берётся из key-value store. Если её ещё нет,
+    генерация уходит в фоновый пул, а шаблон получает оригинал.
+    """
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail()')
+        source = ImageFile(file_)
+        cached = default.kvstore.get(
+            self.thumbnail_file(source, geometry_string, options)
+        )
+        if cached:
+            return cached
+        schedule(source, geometry_string, **options)
+        return source
+
+    def thumbnail_file(self, source, geometry_string, options):
+        """Файл миниатюры source — готовой или ещё нет."""
+        return ImageFile(
+            self._get_thumbnail_filename(
+                source,
+                geometry_string,
+                self._with_defaults(source, dict(options)),
+            ),
+            default.storage,
+        )
+
+    def generate(self, file_, geometry_string, **options):
+        """Синхронно создаёт миниатюру — для пула и команд."""
+        return super().get_thumbnail(file_, geometry_string, **options)
+
+    def _with_defaults(self, source, options):
+        # Те же умолчания, что подставляет ThumbnailBackend.get_thumbnail,
+        # иначе имя файла миниатюры не совпадёт с созданным.
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return options
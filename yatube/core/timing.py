@@ -0,0 +1,150 @@
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+_current = ContextVar('request_timing', default=None)
+
+
+class RequestTiming:
+    """Из чего сложилось время одного запроса; время — в секундах."""
+
+    FIELDS = (
+        'total_time', 'db_queries', 'db_time', 'template_time',
+        'cache_hits', 'cache_misses', 'cache_time', 'thumbnail_time',
+    )
+
+    def __init__(self):
+        for field in self.FIELDS:
+            setattr(self, field, 0)
+
+    def execute(self, execute, sql, params, many, context):
+        """Обёртка для connection.execute_wrapper."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_queries += 1
+            self.db_time += time.perf_counter() - started
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def header(self):
+        """Значение заголовка Server-Timing, длительности — в мс."""
+        metrics = (
+            ('db', self.db_time, f'{self.db_queries} queries'),
+            ('tpl', self.template_time, None),
+            (
+                'cache', self.cache_time,
+                f'{self.cache_hits} hits, {self.cache_misses} misses',
+            ),
+            ('thumb', self.thumbnail_time, None),
+            ('total', self.total_time, None),
+        )
+        return ', '.join(
+            f'{name};dur={duration * 1000:.2f}'
+            + (f';desc="{desc}"' if desc else '')
+            for name, duration, desc in metrics
+        )
+
+
+def current():
+    """Замеры текущего запроса или None вне ServerTimingMiddleware."""
+    return _current.get()
+
+
+@contextmanager
+def timed(field):
+    """Прибавляет время блока к полю замеров текущего запроса."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing = _current.get()
+        if timing is not None:
+            setattr(
+                timing, field,
+                getattr(timing, field) + time.perf_counter() - started,
+            )
+
+
+def count_cache(hits, misses):
+    timing = _current.get()
+    if timing is not None:
+        timing.cache_hits += hits
+        timing.cache_misses += misses
+
+
+class Aggregator:
+    """Суммы замеров по view_name в памяти процесса."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def add(self, view_name, timing):
+        with self._lock:
+            stats = self._views.setdefault(view_name, Counter())
+            stats['requests'] += 1
+            stats.update(timing.as_dict())
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._views.items()}
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+aggregator = Aggregator()
+
+
+def header_allowed(request):
+    """Можно ли показать этому запросу Server-Timing."""
+    options = settings.TIMING_SETINGS
+    if not options['HEADER']:
+        return False
+    if request.META.get('REMOTE_ADDR') in options['ALLOWED_IPS']:
+        return True
+    user = getattr(request, 'user', None)
+    return bool(user and user.is_staff)
+
+
+class ServerTimingMiddleware:
+    """Замеряет БД, шаблоны, кэш и миниатюры в каждом запросе.
+
+    Результат уходит в aggregator по имени маршрута, а персоналу и
+    доверенным адресам — ещё и в заголовок Server-Timing (см.
+    header_allowed).
+    Шаблоны замеряет core.templates.DjangoTemplates, кэш —
+    core.cache.InstrumentedCacheMixin.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timing = request.timing = RequestTiming()
+        token = _current.set(timing)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(timing.execute)
+                    )
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        timing.total_time = time.perf_counter() - started
+        match = request.resolver_match
+        aggregator.add(match.view_name if match else None, timing)
+        if header_allowed(request):
+            response['Server-Timing'] = timing.header()
+        return response
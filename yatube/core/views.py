@@ -1,5 +1,11 @@
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
 
+from .metrics import render as render_metrics
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -15,3 +21,20 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def metrics(request):
+    """Метрики для Prometheus: по токену или с адресов ALLOWED_IPS."""
+    options = settings.METRICS_SETINGS
+    token = options['TOKEN']
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    if not (
+        request.META.get('REMOTE_ADDR') in options['ALLOWED_IPS']
+        or token and hmac.compare_digest(
+            authorization.encode(), f'Bearer {token}'.encode()
+        )
+    ):
+        raise Http404
+    return HttpResponse(
+        render_metrics(), content_type='text/plain; version=0.0.4'
+    )
@@ -0,0 +1,117 @@
+import contextvars
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+_queue = None
+_thread = None
+_lock = threading.Lock()
+
+
+class WriterBusy(Exception):
+    """Очередь записи переполнена — запрос стоит повторить позже."""
+
+
+def _get_queue():
+    global _queue, _thread
+    with _lock:
+        if _thread is None or not _thread.is_alive():
+            _queue = queue.Queue(settings.WRITER_SETINGS['QUEUE_SIZE'])
+            _thread = threading.Thread(
+                target=_loop, args=(_queue,), name='db-writer', daemon=True
+            )
+            _thread.start()
+    return _queue
+
+
+def queue_depth():
+    """Сколько записей ждёт потока записи."""
+    return _queue.qsize() if _queue is not None else 0
+
+
+def write(func, *args, **kwargs):
+    """Выполняет запись func(*args, **kwargs) и возвращает результат.
+
+    При WRITER_SETINGS['ENABLED'] запись уходит единственному потоку
+    записи, который коммитит накопившиеся записи одной транзакцией;
+    вызывающий поток ждёт своего результата или исключения. Если
+    очередь полна дольше TIMEOUT секунд, бросается WriterBusy.
+    Без флага func просто вызывается в текущем потоке.
+    """
+    if (
+        not settings.WRITER_SETINGS['ENABLED']
+        or threading.current_thread() is _thread
+    ):
+        return func(*args, **kwargs)
+    future = Future()
+    # Запись выполняется в копии контекста запроса: так её видит,
+    # например, core.routers.
+    context = contextvars.copy_context()
+    try:
+        _get_queue().put(
+            (partial(context.run, func), args, kwargs, future),
+            timeout=settings.WRITER_SETINGS['TIMEOUT'],
+        )
+    except queue.Full:
+        raise WriterBusy('Очередь записи переполнена')
+    return future.result()
+
+
+def _loop(jobs):
+    while True:
+        batch = [jobs.get()]
+        _collect(jobs, batch)
+        _commit(batch)
+
+
+def _collect(jobs, batch):
+    """Добирает в пачку то, что накопилось, пока шёл прошлый коммит.
+
+    MAX_DELAY > 0 позволяет ещё немного подождать попутчиков — это
+    верхняя граница добавленной задержки.
+    """
+    max_batch = settings.WRITER_SETINGS['MAX_BATCH']
+    deadline = time.monotonic() + settings.WRITER_SETINGS['MAX_DELAY']
+    while len(batch) < max_batch:
+        timeout = deadline - time.monotonic()
+        try:
+            if timeout > 0:
+                batch.append(jobs.get(timeout=timeout))
+            else:
+                batch.append(jobs.get_nowait())
+        except queue.Empty:
+            return
+
+
+def _commit(batch):
+    # Каждая запись — в своей точке сохранения: ошибка одной не
+    # откатывает остальные записи пачки. Но внешние ключи SQLite
+    # проверяет только на COMMIT; если упал он, пачка откатилась
+    # целиком, и записи повторяются по одной.
+    close_old_connections()
+    results = []
+    try:
+        with transaction.atomic():
+            for func, args, kwargs, future in batch:
+                try:
+                    with transaction.atomic():
+                        results.append((future, func(*args, **kwargs), None))
+                except Exception as error:
+                    results.append((future, None, error))
+    except Exception as error:
+        if len(batch) > 1:
+            for job in batch:
+                _commit([job])
+        else:
+            batch[0][-1].set_exception(error)
+        return
+    for future, result, error in results:
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
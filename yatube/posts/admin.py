@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from .models import Group, Post, Comment, Follow
+from .search import fts_available, match_expression, matching_ids
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -10,6 +11,15 @@ class PostAdmin(admin.ModelAdmin):
     list_editable = ('group',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        if not fts_available():
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        if not match_expression(search_term):
+            return queryset, False
+        return queryset.filter(pk__in=matching_ids(search_term)), False
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
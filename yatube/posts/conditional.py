@@ -0,0 +1,65 @@
+import hashlib
+
+from django.db.models import Max
+
+from .feed_cache import get_feed_version
+from .models import Comment, Post, ProfileStats
+
+
+def _etag(request, *parts):
+    """ETag из поколения ленты, зрителя и его CSRF-токена.
+
+    Поколение меняется при любой записи поста, группы или автора.
+    Разметка зависит от пользователя и содержит CSRF-токен, поэтому
+    они тоже входят в ключ. Лентам Last-Modified не отдаётся: дата
+    последнего поста не видит правок и удалений, и клиент, приславший
+    только If-Modified-Since, получил бы устаревший 304.
+    """
+    parts = (
+        request.user.pk if request.user.is_authenticated else 0,
+        request.META.get('CSRF_COOKIE', ''),
+        get_feed_version('index'),
+    ) + parts
+    return hashlib.md5(
+        ':'.join(str(part) for part in parts).encode()
+    ).hexdigest()
+
+
+def index_etag(request):
+    return _etag(request, 'index')
+
+
+def group_etag(request, slug):
+    return _etag(request, 'group', slug)
+
+
+def profile_etag(request, username):
+    # Подписки и новые посты не всегда трогают поколение ленты, но
+    # меняют кнопку и счётчики в шапке профиля.
+    counters = ProfileStats.objects.filter(
+        user__username=username
+    ).values_list(
+        'posts_count', 'followers_count', 'following_count'
+    ).first()
+    return _etag(request, 'profile', username, counters)
+
+
+def post_etag(request, post_id):
+    post = Post.objects.filter(pk=post_id).values_list(
+        'comment_count', 'updated'
+    ).first()
+    latest = Comment.objects.filter(post_id=post_id).aggregate(
+        latest=Max('id')
+    )['latest']
+    return _etag(request, 'post', post_id, post, latest)
+
+
+def post_last_modified(request, post_id):
+    # updated, а не pub_date: правка поста тоже меняет страницу.
+    post = Post.objects.filter(pk=post_id).values_list(
+        'updated', flat=True
+    ).first()
+    comment = Comment.objects.filter(post_id=post_id).aggregate(
+        latest=Max('created')
+    )['latest']
+    return max(filter(None, (post, comment)), default=None)
@@ -0,0 +1,38 @@
+from django.core.cache import cache
+
+from core.cache_tags import tag_versions
+
+FEED_COUNT_KEY = 'feed_count:{feed}'
+
+
+def get_feed_version(feed):
+    """Поколение тега 'feed:<feed>'; меняется с каждой записью ленты."""
+    tag = f'feed:{feed}'
+    return tag_versions([tag])[tag]
+
+
+def feed_count_key(feed):
+    """Ключ кэша с числом постов ленты: 'index', 'group:1', 'profile:1'."""
+    return FEED_COUNT_KEY.format(feed=feed)
+
+
+def forget_feed_counts(post):
+    """Сбрасывает число постов лент, в которые пост входит или входил.
+
+    Группа до правки берётся из _initial_group_id (posts.signals).
+    """
+    feeds = ['index', f'profile:{post.author_id}']
+    for group_id in {post.group_id, getattr(post, '_initial_group_id', None)}:
+        if group_id:
+            feeds.append(f'group:{group_id}')
+    cache.delete_many([feed_count_key(feed) for feed in feeds])
+
+
+def post_tags(posts):
+    """Теги кэша (core.cache_tags) для авторов и групп постов."""
+    tags = set()
+    for post in posts:
+        tags.add(f'author:{post.author_id}')
+        if post.group_id:
+            tags.add(f'group:{post.group_id}')
+    return tags
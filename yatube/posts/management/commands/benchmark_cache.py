@@ -0,0 +1,159 @@
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+from .benchmark_sqlite import percentile
+
+BACKENDS = (
+    ('LocMemCache', 'django.core.cache.backends.locmem.LocMemCache', None),
+    (
+        'FileBasedCache',
+        'django.core.cache.backends.filebased.FileBasedCache',
+        'filebased',
+    ),
+    ('SQLiteCache', 'core.cache.SQLiteCache', 'cache.sqlite3'),
+)
+
+# Доли операций: чтение фрагмента (при промахе — запись), пакетное
+# чтение, incr счётчика поколения и сброс ключа.
+MIX = (('get', .8), ('get_many', .1), ('incr', .05), ('delete', .05))
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает LocMemCache, FileBasedCache и core.cache.SQLiteCache '
+        'под нагрузкой нескольких процессов, как у воркеров gunicorn: '
+        'операций в секунду, задержки, долю попаданий и то, доходят ли '
+        'incr одного процесса до остальных. У LocMemCache копия кэша '
+        'своя в каждом процессе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=3)
+        parser.add_argument(
+            '--keys', type=int, default=2000,
+            help='Сколько разных ключей читают процессы.'
+        )
+        parser.add_argument(
+            '--value-size', type=int, default=4096,
+            help='Размер значения в байтах, как у фрагмента ленты.'
+        )
+        parser.add_argument(
+            '--max-entries', type=int, default=20000,
+            help='MAX_ENTRIES кэшей; меньше --keys — проверка вытеснения.'
+        )
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp()
+        context = multiprocessing.get_context('fork')
+        try:
+            for title, backend, location in BACKENDS:
+                location = location and os.path.join(directory, location)
+                queue = context.Queue()
+                deadline = time.monotonic() + options['seconds'] + 0.5
+                workers = [
+                    context.Process(
+                        target=worker,
+                        args=(
+                            backend, location, options, deadline,
+                            number, queue,
+                        ),
+                    )
+                    for number in range(options['processes'])
+                ]
+                for process in workers:
+                    process.start()
+                results = [queue.get() for _ in workers]
+                for process in workers:
+                    process.join()
+                self.report(title, results, options['seconds'])
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def report(self, title, results, seconds):
+        timings = {}
+        hits = misses = 0
+        for result in results:
+            hits += result['hits']
+            misses += result['misses']
+            for name, values in result['timings'].items():
+                timings.setdefault(name, []).extend(values)
+        # Общий счётчик поколения видит incr всех процессов, а копия
+        # в памяти процесса — только его собственные.
+        increments = sum(result['increments'] for result in results)
+        seen = max(result['version'] or 0 for result in results)
+        total = sum(len(values) for values in timings.values())
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        self.stdout.write(
+            f'  {total / seconds:.0f} операций/с, '
+            f'попаданий {hits / max(hits + misses, 1):.0%}, '
+            f'счётчик поколения {seen} из {increments} incr'
+        )
+        for name, values in timings.items():
+            self.stdout.write(
+                f'  {name}: p50 {percentile(values, .5) * 1e6:.0f} мкс, '
+                f'p99 {percentile(values, .99) * 1e6:.0f} мкс'
+            )
+
+
+def worker(backend, location, options, deadline, number, queue):
+    cache = import_string(backend)(location, {
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': options['max_entries']},
+    })
+    rng = random.Random(number)
+    value = 'x' * options['value_size']
+    keys = [f'fragment:{i}' for i in range(options['keys'])]
+    operations = [name for name, _ in MIX]
+    weights = [share for _, share in MIX]
+    timings = {name: [] for name in operations}
+    hits = misses = increments = 0
+    # Процессы стартуют одновременно, замер идёт последние --seconds.
+    start = deadline - options['seconds']
+    while time.monotonic() < deadline:
+        # Популярные ключи читают чаще, как первые страницы лент.
+        key = keys[min(int(rng.paretovariate(1)) - 1, len(keys) - 1)]
+        operation = rng.choices(operations, weights)[0]
+        started = time.perf_counter()
+        if operation == 'get':
+            if cache.get(key) is None:
+                cache.set(key, value)
+                found = False
+            else:
+                found = True
+        elif operation == 'get_many':
+            batch = rng.sample(keys[:100], 10)
+            found = len(cache.get_many(batch)) == len(batch)
+        elif operation == 'incr':
+            increments += 1
+            try:
+                cache.incr('version')
+            except ValueError:
+                cache.add('version', 1)
+            found = None
+        else:
+            cache.delete(key)
+            found = None
+        elapsed = time.perf_counter() - started
+        if time.monotonic() < start:
+            continue
+        timings[operation].append(elapsed)
+        if found is not None:
+            hits += found
+            misses += not found
+    # Ждём остальных, чтобы прочитать итог их incr.
+    time.sleep(0.2)
+    queue.put({
+        'timings': timings,
+        'hits': hits,
+        'misses': misses,
+        'increments': increments,
+        'version': cache.get('version'),
+    })
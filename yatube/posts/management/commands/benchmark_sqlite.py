@@ -0,0 +1,153 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection
+from django.db import connections
+from django.test.utils import override_settings
+
+from core.sqlite import active_pragmas
+from core.writer import write
+from posts.models import Post, User
+
+# Умолчания SQLite и Django: с ними сравниваются настройки проекта.
+BASELINE = {
+    'PRAGMAS': {
+        'journal_mode': 'delete',
+        'synchronous': 'full',
+        'busy_timeout': 5000,
+        'temp_store': 'default',
+        'mmap_size': 0,
+        'cache_size': -2000,
+    },
+}
+
+
+def percentile(values, share):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(int(share * len(values)), len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагружает базу потоками, которые читают ленту и пишут посты, '
+        'и сравнивает пропускную способность с умолчаниями SQLite '
+        '(журнал delete, synchronous=full, новое подключение на каждый '
+        'запрос), с SQLITE_SETINGS проекта и с ними же плюс единым '
+        'потоком записи из core.writer. Созданные посты удаляются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument(
+            '--seconds', type=float, default=5,
+            help='Длительность каждого прогона.'
+        )
+        parser.add_argument(
+            '--write-share', type=float, default=0.1,
+            help='Доля операций записи.'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда сравнивает настройки SQLite.')
+        self.user_ids = list(
+            User.objects.values_list('pk', flat=True)[:1000]
+        )
+        if not self.user_ids:
+            raise CommandError('Нужен хотя бы один пользователь.')
+        with override_settings(SQLITE_SETINGS=BASELINE):
+            self.report('умолчания SQLite', self.run(options, 0))
+        conn_max_age = connection.settings_dict['CONN_MAX_AGE']
+        self.report('SQLITE_SETINGS', self.run(options, conn_max_age))
+        with override_settings(
+            WRITER_SETINGS={**settings.WRITER_SETINGS, 'ENABLED': True}
+        ):
+            self.report(
+                'SQLITE_SETINGS и поток записи',
+                self.run(options, conn_max_age),
+            )
+
+    def run(self, options, conn_max_age):
+        # Подключения потоков открываются заново и получают PRAGMA
+        # из текущих настроек.
+        connection.close()
+        settings_dict = connections.databases['default']
+        saved = settings_dict['CONN_MAX_AGE']
+        settings_dict['CONN_MAX_AGE'] = conn_max_age
+        results = []
+        deadline = time.monotonic() + options['seconds']
+        threads = [
+            threading.Thread(
+                target=self.worker,
+                args=(deadline, options['write_share'], number, results),
+            )
+            for number in range(options['threads'])
+        ]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            settings_dict['CONN_MAX_AGE'] = saved
+        pragmas = active_pragmas(connection)
+        created = [pk for result in results for pk in result['created']]
+        Post.objects.filter(pk__in=created).delete()
+        connection.close()
+        return {
+            'pragmas': pragmas,
+            'seconds': options['seconds'],
+            'reads': [t for result in results for t in result['reads']],
+            'writes': [t for result in results for t in result['writes']],
+            'errors': sum(result['errors'] for result in results),
+        }
+
+    def worker(self, deadline, write_share, number, results):
+        rng = random.Random(number)
+        result = {'reads': [], 'writes': [], 'errors': 0, 'created': []}
+        try:
+            while time.monotonic() < deadline:
+                # Каждая итерация — как отдельный запрос к сайту.
+                close_old_connections()
+                started = time.perf_counter()
+                try:
+                    if rng.random() < write_share:
+                        post = write(
+                            Post.objects.create,
+                            text='Нагрузочный пост',
+                            author_id=rng.choice(self.user_ids),
+                        )
+                        result['created'].append(post.pk)
+                        kind = 'writes'
+                    else:
+                        list(Post.objects.select_related(
+                            'author', 'group'
+                        )[:10])
+                        kind = 'reads'
+                except OperationalError:
+                    result['errors'] += 1
+                    continue
+                result[kind].append(time.perf_counter() - started)
+        finally:
+            close_old_connections()
+            connection.close()
+            results.append(result)
+
+    def report(self, title, run):
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        self.stdout.write(', '.join(
+            f'{name}={value}' for name, value in run['pragmas'].items()
+        ))
+        for kind in ('reads', 'writes'):
+            timings = run[kind]
+            self.stdout.write(
+                f'  {kind}: {len(timings) / run["seconds"]:.0f}/с, '
+                f'p50 {percentile(timings, .5) * 1000:.2f} мс, '
+                f'p99 {percentile(timings, .99) * 1000:.2f} мс'
+            )
+        self.stdout.write(f'  ошибок "database is locked": {run["errors"]}')
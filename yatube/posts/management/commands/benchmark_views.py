@@ -0,0 +1,231 @@
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth.tokens import default_token_generator
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from about import urls as about_urls
+from posts import urls as posts_urls
+from posts.models import Follow, Post, User
+from users import urls as users_urls
+
+APPS = (posts_urls, users_urls, about_urls)
+# Маршруты, которые разлогинивают клиента: для них берётся отдельный.
+LOGOUT_ROUTES = ('users:logout',)
+
+
+def percentile(values, share):
+    """Процентиль по ближайшему рангу; values отсортированы."""
+    index = max(int(round(share * len(values) + 0.5)) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+@contextmanager
+def database_copy():
+    """Подменяет базу default её временной копией на время замера.
+
+    Откат в atomic() не запускал бы хуки on_commit (очередь записи,
+    миниатюры, сброс кэша), и записи выходили бы дешевле, чем в бою.
+    База в памяти (тесты) и так одноразовая — замер идёт прямо в ней.
+    """
+    if connection.vendor != 'sqlite':
+        raise CommandError('Копию базы команда умеет делать только SQLite.')
+    if connection.is_in_memory_db():
+        yield
+        return
+    settings_dict = connection.settings_dict
+    original = settings_dict['NAME']
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'benchmark.sqlite3')
+        connection.ensure_connection()
+        copy = sqlite3.connect(path)
+        try:
+            connection.connection.backup(copy)
+        finally:
+            copy.close()
+        connection.close()
+        settings_dict['NAME'] = path
+        try:
+            yield
+        finally:
+            connection.close()
+            settings_dict['NAME'] = original
+
+
+@contextmanager
+def empty_caches():
+    """Подменяет кэши пустыми с теми же бэкендами на время замера.
+
+    Страницы и фрагменты, отрисованные по копии базы, не должны попасть
+    в общий кэш узла: там они прожили бы до TIMEOUT.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        caches = {
+            alias: {
+                **params,
+                'LOCATION': os.path.join(directory, f'{alias}.sqlite3'),
+            }
+            for alias, params in settings.CACHES.items()
+        }
+        with override_settings(CACHES=caches):
+            yield
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет тестовым клиентом все маршруты posts, users и about '
+        'на текущей базе и печатает JSON с p50/p95/p99, числом '
+        'запросов к БД и пиком памяти для каждого представления. '
+        'Данные удобно готовить командой generate_data. Замер идёт '
+        'на временной копии базы: записи маршрутов вроде follow '
+        'коммитятся вместе с хуками on_commit, а рабочая база и кэш '
+        'не меняются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=50,
+            help='Сколько раз запросить каждый маршрут.'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=3,
+            help='Сколько запросов сделать до замера.'
+        )
+        parser.add_argument(
+            '--anonymous', action='store_true',
+            help='Не логиниться: закрытые страницы дадут редирект.'
+        )
+        parser.add_argument(
+            '--only', nargs='+', default=(),
+            help='Замерить только эти маршруты, например posts:index.'
+        )
+        parser.add_argument('--output', help='Записать JSON в файл.')
+
+    def handle(self, *args, **options):
+        with database_copy(), empty_caches():
+            results = self.measure_all(options)
+        report = json.dumps(
+            {
+                'posts': Post.objects.count(),
+                'users': User.objects.count(),
+                'repeat': options['repeat'],
+                'anonymous': options['anonymous'],
+                'views': results,
+            },
+            ensure_ascii=False,
+            indent=2,
+        )
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(report)
+        else:
+            self.stdout.write(report)
+
+    def sample_user(self):
+        # Читатель, подписанный на автора с постами:
+        # так лента подписок и профиль не пустые.
+        follow = Follow.objects.filter(
+            author__posts__isnull=False
+        ).select_related('user').first()
+        if follow is None:
+            raise CommandError(
+                'В базе нет подписок на авторов с постами, '
+                'сначала запустите generate_data.'
+            )
+        return follow.user
+
+    def sample_kwargs(self):
+        post = (
+            Post.objects.filter(author=self.user).first()
+            or Post.objects.filter(group__isnull=False).first()
+        )
+        group = Post.objects.filter(
+            group__isnull=False
+        ).select_related('group').first().group
+        author = Follow.objects.filter(user=self.user).first().author
+        return {
+            'post_id': post.pk,
+            'slug': group.slug,
+            'username': author.username,
+            'uidb64': urlsafe_base64_encode(force_bytes(self.user.pk)),
+            'token': default_token_generator.make_token(self.user),
+        }
+
+    def routes(self, only):
+        for module in APPS:
+            for pattern in module.urlpatterns:
+                if not isinstance(pattern, URLPattern):
+                    continue
+                name = f'{module.app_name}:{pattern.name}'
+                if only and name not in only:
+                    continue
+                kwargs = {
+                    key: self.kwargs[key]
+                    for key in pattern.pattern.converters
+                }
+                yield name, reverse(name, kwargs=kwargs)
+
+    def client(self, options):
+        client = Client()
+        if not options['anonymous']:
+            client.force_login(self.user)
+        return client
+
+    def get(self, client, url, name, options):
+        if name in LOGOUT_ROUTES:
+            client = self.client(options)
+        return client.get(url)
+
+    def measure_all(self, options):
+        self.user = self.sample_user()
+        self.kwargs = self.sample_kwargs()
+        results = {}
+        for name, url in self.routes(options['only']):
+            results[name] = self.measure(url, name, options)
+            self.stderr.write(
+                f'{name}: p50 {results[name]["p50_ms"]} мс, '
+                f'{results[name]["queries"]} запросов'
+            )
+        return results
+
+    def measure(self, url, name, options):
+        client = self.client(options)
+        for _ in range(options['warmup']):
+            self.get(client, url, name, options)
+        timings = []
+        counts = []
+        for _ in range(options['repeat']):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = self.get(client, url, name, options)
+                timings.append(time.perf_counter() - started)
+            counts.append(len(queries))
+        # Память замеряется отдельным запросом: tracemalloc замедляет
+        # выполнение и исказил бы время.
+        tracemalloc.start()
+        self.get(client, url, name, options)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        timings.sort()
+        counts.sort()
+        return {
+            'url': url,
+            'status': response.status_code,
+            'p50_ms': round(percentile(timings, .50) * 1000, 2),
+            'p95_ms': round(percentile(timings, .95) * 1000, 2),
+            'p99_ms': round(percentile(timings, .99) * 1000, 2),
+            'queries': percentile(counts, .50),
+            'memory_peak_kb': round(peak / 1024, 1),
+        }
@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.models import Comment, Follow, Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Печатает план и среднее время запросов лент, комментариев '
+        'и подписок на текущей базе. Запустите до и после миграции '
+        'с индексами, чтобы сравнить планы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Сколько раз выполнить каждый запрос для замера.'
+        )
+
+    def handle(self, *args, **options):
+        post = Post.objects.filter(group__isnull=False).first()
+        follow = Follow.objects.first()
+        if post is None or follow is None:
+            raise CommandError(
+                'Нужны хотя бы один пост с группой и одна подписка.'
+            )
+        deep = Post.objects.order_by('-pub_date', '-id')[
+            Post.objects.count() // 2
+        ]
+        ordering = ('-pub_date', '-id')
+        queries = {
+            'index': Post.objects.order_by(*ordering)[:10],
+            'index, глубокий курсор': Post.objects.filter(
+                pub_date__lte=deep.pub_date
+            ).order_by(*ordering)[:10],
+            'profile': Post.objects.filter(
+                author_id=post.author_id
+            ).order_by(*ordering)[:10],
+            'group_posts': Post.objects.filter(
+                group_id=post.group_id
+            ).order_by(*ordering)[:10],
+            'comments': Comment.objects.filter(
+                post_id=post.pk
+            ).order_by('-created')[:10],
+            'follow (user, author)': Follow.objects.filter(
+                user_id=follow.user_id, author_id=follow.author_id
+            ),
+            'followers (author)': Follow.objects.filter(
+                author_id=follow.author_id
+            ).values_list('user_id', flat=True),
+        }
+        for name, queryset in queries.items():
+            started = time.perf_counter()
+            for _ in range(options['repeat']):
+                list(queryset.all())
+            elapsed = (time.perf_counter() - started) / options['repeat']
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{name}: {elapsed * 1000:.2f} мс'
+            ))
+            self.stdout.write(queryset.explain())
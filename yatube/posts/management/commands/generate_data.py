@@ -0,0 +1,286 @@
+import io
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import islice
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.images import get_image_dimensions
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+from PIL import Image
+
+from core.storage import file_digest
+from posts import stats, timeline
+from posts.models import Comment, Follow, Group, Post, User
+from posts.rendering import render_text
+
+# Размеры набора: число постов задаёт остальное.
+SCALES = {
+    '10k': 10_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+    '10m': 10_000_000,
+}
+BATCH_SIZE = 5_000
+WORDS = (
+    'лев толстой война мир анна каренина воскресение детство отрочество '
+    'юность казаки хаджи мурат крейцерова соната смерть ивана ильича '
+    'севастопольские рассказы утро помещика метель два гусара'
+).split()
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Временно отключает auto_now и auto_now_add, чтобы разнести даты."""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field, _, _ in saved:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now = auto_now
+            field.auto_now_add = auto_now_add
+
+
+def next_number(queryset, field, prefix):
+    """Первый свободный номер для значений вида <prefix><номер>.
+
+    Не count(): после удалений он меньше занятых номеров.
+    """
+    taken = queryset.filter(
+        **{f'{field}__regex': rf'^{prefix}[0-9]+$'}
+    ).values_list(field, flat=True)
+    return max((int(value[len(prefix):]) for value in taken), default=-1) + 1
+
+
+def created_ids(model, last_id):
+    """id строк, вставленных после last_id.
+
+    bulk_create на SQLite не возвращает pk, поэтому они читаются
+    обратно. Обычно это сплошной диапазон — он не занимает памяти.
+    """
+    created = model.objects.filter(pk__gt=last_id).aggregate(
+        first=Min('pk'), last=Max('pk'), count=Count('pk')
+    )
+    if not created['count']:
+        return range(0)
+    if created['last'] - created['first'] + 1 == created['count']:
+        return range(created['first'], created['last'] + 1)
+    return list(model.objects.filter(pk__gt=last_id).values_list(
+        'pk', flat=True
+    ))
+
+
+def last_id(model):
+    return model.objects.aggregate(last=Max('pk'))['last'] or 0
+
+
+def batches(iterable, size=BATCH_SIZE):
+    iterable = iter(iterable)
+    while True:
+        batch = list(islice(iterable, size))
+        if not batch:
+            return
+        yield batch
+
+
+class PowerLaw:
+    """Выбор id с весом 1 / rank**alpha: немногие авторы популярны."""
+
+    def __init__(self, ids, alpha, rng):
+        self.ids = list(ids)
+        rng.shuffle(self.ids)
+        total = 0
+        self.cum_weights = []
+        for rank in range(1, len(self.ids) + 1):
+            total += 1 / rank ** alpha
+            self.cum_weights.append(total)
+        self.rng = rng
+
+    def sample(self, k):
+        return self.rng.choices(self.ids, cum_weights=self.cum_weights, k=k)
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, группами, постами, '
+        'комментариями, картинками и степенным графом подписок.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', choices=SCALES, default='10k',
+            help='Число постов: 10k, 100k, 1m или 10m.'
+        )
+        parser.add_argument('--posts', type=int, help='Точное число постов.')
+        parser.add_argument(
+            '--posts-per-user', type=int, default=50,
+            help='Сколько в среднем постов на пользователя.'
+        )
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument(
+            '--comments-per-post', type=float, default=2.0,
+        )
+        parser.add_argument(
+            '--follows-per-user', type=int, default=30,
+            help='Среднее число подписок пользователя.'
+        )
+        parser.add_argument(
+            '--images', type=int, default=20,
+            help='Сколько разных картинок раздать постам.'
+        )
+        parser.add_argument(
+            '--image-share', type=float, default=0.3,
+            help='Доля постов с картинкой.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        posts = options['posts'] or SCALES[options['scale']]
+        users = max(posts // options['posts_per_user'], 2)
+        with transaction.atomic():
+            user_ids = self.create_users(users)
+            group_ids = self.create_groups(options['groups'])
+            images = self.create_images(options['images'], rng)
+            with explicit_dates(
+                Post._meta.get_field('pub_date'),
+                Post._meta.get_field('updated'),
+                Comment._meta.get_field('created'),
+            ):
+                post_ids = self.create_posts(
+                    posts, user_ids, group_ids, images,
+                    options['image_share'], rng,
+                )
+                self.create_comments(
+                    int(posts * options['comments_per_post']),
+                    post_ids, user_ids, rng,
+                )
+            self.create_follows(user_ids, options['follows_per_user'], rng)
+        self.stdout.write('Пересчитываю счётчики и ленты подписок...')
+        stats.recount()
+        timeline.rebuild()
+        # bulk_create обходит сигналы: закэшированные ленты, их число
+        # постов и страницы устарели все разом.
+        cache.clear()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {users} пользователей, {posts} постов.'
+        ))
+
+    def create_users(self, count):
+        start = next_number(User.objects.all(), 'username', 'user')
+        for batch in batches(
+            User(
+                username=f'user{start + number}',
+                first_name='Пользователь',
+                last_name=str(start + number),
+            )
+            for number in range(count)
+        ):
+            User.objects.bulk_create(batch)
+        return list(User.objects.values_list('pk', flat=True))
+
+    def create_groups(self, count):
+        start = next_number(Group.objects.all(), 'slug', 'group-')
+        Group.objects.bulk_create(
+            Group(
+                title=f'Группа {start + number}',
+                slug=f'group-{start + number}',
+                description='Синтетическая группа',
+            )
+            for number in range(count)
+        )
+        return list(Group.objects.values_list('pk', flat=True))
+
+    def create_images(self, count, rng):
+        """Сохраняет картинки и возвращает поля поста для каждой.
+
+        bulk_create не вызывает Post.save(), поэтому размеры и хеш
+        считаются здесь, один раз на картинку.
+        """
+        storage = Post._meta.get_field('image').storage
+        images = []
+        for number in range(count):
+            buffer = io.BytesIO()
+            Image.new(
+                'RGB',
+                (rng.randint(400, 1600), rng.randint(300, 1200)),
+                tuple(rng.randint(0, 255) for _ in range(3)),
+            ).save(buffer, 'JPEG')
+            content = ContentFile(buffer.getvalue())
+            width, height = get_image_dimensions(content)
+            images.append({
+                'image': storage.save(f'posts/synthetic{number}.jpg', content),
+                'image_width': width,
+                'image_height': height,
+                'image_size': content.size,
+                'image_hash': file_digest(content),
+            })
+        return images
+
+    @staticmethod
+    def new_post(text, **fields):
+        # bulk_create не вызывает Post.save(): производные от текста
+        # поля заполняются здесь.
+        return Post(text=text, **render_text(text), **fields)
+
+    def create_posts(self, count, user_ids, group_ids, images, share, rng):
+        authors = PowerLaw(user_ids, 1.1, rng)
+        now = timezone.now()
+        step = timedelta(days=3 * 365) / count
+        before = last_id(Post)
+        for batch in batches(
+            self.new_post(
+                text=' '.join(rng.choices(WORDS, k=rng.randint(5, 60))),
+                pub_date=now - step * (count - number),
+                updated=now - step * (count - number),
+                author_id=author_id,
+                group_id=rng.choice(group_ids) if rng.random() < .5 else None,
+                **(
+                    rng.choice(images)
+                    if images and rng.random() < share else {}
+                ),
+            )
+            for number, author_id in enumerate(authors.sample(count))
+        ):
+            Post.objects.bulk_create(batch)
+        return created_ids(Post, before)
+
+    def create_comments(self, count, post_ids, user_ids, rng):
+        # Комментарии тоже степенные: обсуждают в основном популярное.
+        posts = PowerLaw(post_ids, 1.0, rng) if len(post_ids) < 10 ** 6 \
+            else None
+        now = timezone.now()
+        for batch in batches(
+            Comment(
+                post_id=(
+                    posts.sample(1)[0] if posts else rng.choice(post_ids)
+                ),
+                author_id=rng.choice(user_ids),
+                text=' '.join(rng.choices(WORDS, k=rng.randint(3, 20))),
+                created=now - timedelta(seconds=number),
+            )
+            for number in range(count)
+        ):
+            Comment.objects.bulk_create(batch)
+
+    def create_follows(self, user_ids, per_user, rng):
+        authors = PowerLaw(user_ids, 1.2, rng)
+
+        def follows():
+            for user_id in user_ids:
+                wanted = min(
+                    int(rng.paretovariate(1.5) * per_user / 3),
+                    len(user_ids) - 1,
+                )
+                chosen = set(authors.sample(wanted)) - {user_id}
+                for author_id in chosen:
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        for batch in batches(follows()):
+            Follow.objects.bulk_create(batch, ignore_conflicts=True)
@@ -0,0 +1,50 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from posts.models import Post
+
+
+def generate(name):
+    # Хранилище поля входит в ключ миниатюры, как в core.thumbnails.
+    source = ImageFile(name, Post._meta.get_field('image').storage)
+    sizes = settings.THUMBNAIL_SETINGS['SIZES']
+    try:
+        for geometry_string, options in sizes.values():
+            default.backend.generate(source, geometry_string, **options)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Заранее создаёт миниатюры для всех картинок постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int,
+            default=max(settings.THUMBNAIL_SETINGS['WORKERS'], 1),
+            help='Сколько картинок обрабатывать параллельно.'
+        )
+
+    def handle(self, *args, **options):
+        names = Post.objects.exclude(image='').values_list(
+            'image', flat=True
+        ).distinct()
+        failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for name, future in [
+                (name, pool.submit(generate, name))
+                for name in names.iterator()
+            ]:
+                try:
+                    future.result()
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Миниатюры готовы, ошибок: {failed}.'
+        ))
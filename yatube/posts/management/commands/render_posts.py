@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.rendering import rerender
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает HTML, начало текста и заголовок постов '
+        '(после смены POST_RENDER_SETINGS).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--missing', action='store_true',
+            help='Только посты, у которых эти поля ещё пусты.',
+        )
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        posts = Post.objects.all()
+        if options['missing']:
+            posts = posts.filter(text_html='')
+        count = rerender(posts, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано постов: {count}.'
+        ))
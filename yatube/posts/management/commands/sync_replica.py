@@ -0,0 +1,50 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную базу SQLite в файл реплики через backup API. '
+        'Копирование идёт постранично и не останавливает запись; '
+        'с --interval команда повторяет его в цикле.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять каждые N секунд; 0 — скопировать один раз.'
+        )
+        parser.add_argument(
+            '--pages', type=int, default=1024,
+            help='Сколько страниц копировать за шаг.'
+        )
+
+    def handle(self, *args, **options):
+        alias = settings.REPLICA_SETINGS['ALIAS']
+        if alias not in settings.DATABASES:
+            raise CommandError(
+                f'В DATABASES нет {alias!r}: включите '
+                f"REPLICA_SETINGS['ENABLED']."
+            )
+        source = connections['default']
+        if source.vendor != 'sqlite':
+            raise CommandError('Команда копирует только SQLite.')
+        while True:
+            started = time.perf_counter()
+            source.ensure_connection()
+            target = sqlite3.connect(settings.DATABASES[alias]['NAME'])
+            try:
+                source.connection.backup(target, pages=options['pages'])
+            finally:
+                target.close()
+            self.stdout.write(
+                f'Реплика обновлена за '
+                f'{(time.perf_counter() - started) * 1000:.0f} мс'
+            )
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,64 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:34
+
+import core.storage
+import hashlib
+
+from django.core.files.images import get_image_dimensions
+from django.db import migrations, models
+
+
+def fill_image_metadata(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    posts = Post.objects.exclude(image='').only('image')
+    for post in posts.iterator():
+        try:
+            with post.image.open('rb') as image:
+                digest = hashlib.sha256()
+                for chunk in image.chunks():
+                    digest.update(chunk)
+                width, height = get_image_dimensions(image)
+                size = image.size
+        except (OSError, ValueError):
+            continue
+        Post.objects.filter(pk=post.pk).update(
+            image_width=width,
+            image_height=height,
+            image_size=size,
+            image_hash=digest.hexdigest(),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_auto_20261018_0231'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, verbose_name='SHA-256 картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Высота картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_size',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Размер картинки, байт'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Ширина картинки'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=core.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.RunPython(fill_image_metadata, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:05
+
+from importlib import import_module
+
+from django.db import migrations, models
+from django.db.models import F
+
+post_fts = import_module('posts.migrations.0015_post_fts')
+
+# SQLite добавляет и удаляет столбец, пересоздавая таблицу, а вместе
+# со старой таблицей пропадают триггеры индекса FTS5 из 0015.
+restore_fts_triggers = post_fts.run_on_sqlite(
+    post_fts.BACKWARD_SQL[:3] + post_fts.FORWARD_SQL[1:]
+)
+
+
+def fill_updated(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.update(updated=F('pub_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_post_fts'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_fts_triggers),
+        migrations.AddField(
+            model_name='post',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения'),
+        ),
+        migrations.RunPython(fill_updated, migrations.RunPython.noop),
+        migrations.RunPython(restore_fts_triggers, migrations.RunPython.noop),
+    ]
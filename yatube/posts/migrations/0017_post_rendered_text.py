@@ -0,0 +1,81 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:08
+
+from importlib import import_module
+
+from django.db import migrations, models
+from django.template.defaultfilters import linebreaksbr
+from django.utils import timezone
+from django.utils.text import Truncator
+
+# Триггеры FTS5 пропадают при пересоздании таблицы, см. 0016.
+restore_fts_triggers = import_module(
+    'posts.migrations.0016_post_updated'
+).restore_fts_triggers
+
+
+# Копия posts.rendering на момент миграции: правки рендеринга и
+# POST_RENDER_SETINGS не должны менять то, что делает миграция.
+def render_text(text):
+    return (
+        str(linebreaksbr(text, autoescape=True)),
+        Truncator(text).chars(300),
+        Truncator(text).words(30, truncate=' …'),
+    )
+
+
+def fill_rendered_text(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    connection = schema_editor.connection
+    quote = connection.ops.quote_name
+    sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+        quote(Post._meta.db_table),
+        ', '.join(
+            f'{quote(column)} = %s'
+            for column in ('text_html', 'preview', 'title', 'updated')
+        ),
+        quote('id'),
+    )
+    updated = Post._meta.get_field('updated').get_db_prep_save(
+        timezone.now(), connection
+    )
+    posts = Post.objects.using(connection.alias).order_by('pk')
+    last_pk = 0
+    while True:
+        batch = list(
+            posts.filter(pk__gt=last_pk).values_list('pk', 'text')[:500]
+        )
+        if not batch:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, [
+                (*render_text(text), updated, pk) for pk, text in batch
+            ])
+        last_pk = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_post_updated'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_fts_triggers),
+        migrations.AddField(
+            model_name='post',
+            name='preview',
+            field=models.TextField(blank=True, editable=False, verbose_name='Начало текста'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='text_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='Текст в HTML'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='title',
+            field=models.TextField(blank=True, editable=False, verbose_name='Заголовок'),
+        ),
+        migrations.RunPython(fill_rendered_text, migrations.RunPython.noop),
+        migrations.RunPython(restore_fts_triggers, migrations.RunPython.noop),
+    ]
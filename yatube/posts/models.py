@@ -1,14 +1,48 @@
 from django.contrib.auth import get_user_model
+from django.core.files.images import get_image_dimensions
 from django.db import models
+from django.utils import timezone
 
 from core.models import CreatedModel
+from core.storage import ContentAddressedStorage, file_digest
+
+from .rendering import RENDERED_FIELDS, render_text, rerender
 
 User = get_user_model()
 
+# Поля, которые не нужны спискам постов: там выводится preview.
+LIST_DEFERRED = ('text', 'text_html')
+
+
+class PostQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # Производные от text поля не должны отставать и при update(),
+        # а updated — сбрасывать закэшированную карточку, как rerender().
+        text = kwargs.get('text')
+        if text is None or isinstance(text, str):
+            if text is not None:
+                kwargs.update(render_text(text))
+                kwargs.setdefault('updated', timezone.now())
+            return super().update(**kwargs)
+        pks = list(self.values_list('pk', flat=True))
+        updated = super().update(**kwargs)
+        rerender(Post.objects.filter(pk__in=pks))
+        return updated
+
+    update.alters_data = True
+
 
 class Post(models.Model):
     text = models.TextField('Текст поста', help_text='Введите текст поста')
+    # Выводятся из text при сохранении (posts.rendering): ленты читают
+    # только preview, а text и text_html откладывают (LIST_DEFERRED).
+    text_html = models.TextField('Текст в HTML', blank=True, editable=False)
+    preview = models.TextField('Начало текста', blank=True, editable=False)
+    title = models.TextField('Заголовок', blank=True, editable=False)
     pub_date = models.DateTimeField('Дата публикации', auto_now_add=True)
+    # Входит в ключ кэша карточки поста: меняется при каждом сохранении
+    # и при правке автора или группы (posts.signals).
+    updated = models.DateTimeField('Дата изменения', auto_now=True)
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -27,15 +61,70 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
-        blank=True
+        blank=True,
+        storage=ContentAddressedStorage(),
+    )
+    # Не width_field/height_field: с ними Django открывает файл при
+    # создании каждого экземпляра, у которого размеры ещё не заполнены.
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки', null=True, blank=True, editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки', null=True, blank=True, editable=False
+    )
+    image_size = models.PositiveIntegerField(
+        'Размер картинки, байт', null=True, blank=True, editable=False
+    )
+    image_hash = models.CharField(
+        'SHA-256 картинки',
+        max_length=64,
+        blank=True,
+        editable=False,
+        db_index=True,
     )
+    comment_count = models.PositiveIntegerField(
+        'Число комментариев', default=0, editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx',
+            ),
+            models.Index(
+                fields=['-pub_date', '-id'], name='post_pub_date_id_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        if not self.image:
+            self.image_width = self.image_height = self.image_size = None
+            self.image_hash = ''
+        elif not self.image._committed:
+            self.image_width, self.image_height = get_image_dimensions(
+                self.image
+            )
+            self.image_size = self.image.size
+            self.image_hash = file_digest(self.image)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'text' in update_fields:
+            for field, value in render_text(self.text).items():
+                setattr(self, field, value)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, *RENDERED_FIELDS}
+        super().save(*args, **kwargs)
+
 
 class Group(models.Model):
     title = models.CharField('Название группы', max_length=200)
@@ -65,6 +154,11 @@ class Comment(CreatedModel):
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(
+                fields=['post', '-created'], name='comment_post_created_idx'
+            ),
+        ]
 
 
 class Follow(models.Model):
@@ -83,3 +177,61 @@ class Follow(models.Model):
         constraints = [models.UniqueConstraint(
             fields=['user', 'author'], name='unique_follow')
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'], name='follow_author_user_idx'
+            ),
+        ]
+
+
+class Timeline(models.Model):
+    """Материализованная лента подписок: строка на пару читатель-пост."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель',
+    )
+    post = models.ForeignKey(
+        'Post',
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        ordering = ['-pub_date']
+        constraints = [models.UniqueConstraint(
+            fields=['user', 'post'], name='unique_timeline')
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx',
+            ),
+            models.Index(
+                fields=['user', 'author'], name='timeline_user_author_idx'
+            ),
+        ]
+
+
+class ProfileStats(models.Model):
+    """Счётчики профиля, чтобы не считать COUNT(*) на каждый просмотр."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков', default=0
+    )
+    following_count = models.PositiveIntegerField('Число подписок', default=0)
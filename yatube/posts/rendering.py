@@ -0,0 +1,75 @@
+from django.conf import settings
+from django.db import connections, transaction
+from django.template.defaultfilters import linebreaksbr
+from django.utils import timezone
+from django.utils.text import Truncator
+
+from core.cache_tags import invalidate
+
+RENDERED_FIELDS = ('text_html', 'preview', 'title')
+
+
+def render_text(text):
+    """Поля поста, которые выводятся из текста: {'text_html': ..., ...}.
+
+    Считаются при записи поста, а не на каждом чтении: text_html уже
+    экранирован, preview и title — простой текст.
+    """
+    options = settings.POST_RENDER_SETINGS
+    return {
+        'text_html': str(linebreaksbr(text, autoescape=True)),
+        'preview': Truncator(text).chars(options['PREVIEW_LENGTH']),
+        # Как у фильтра truncatewords, который выводил заголовок раньше.
+        'title': Truncator(text).words(
+            options['TITLE_WORDS'], truncate=' …'
+        ),
+    }
+
+
+def rerender(posts, batch_size=None):
+    """Пересчитывает поля RENDERED_FIELDS постов из posts.
+
+    Пачками по id, одним UPDATE на пачку через executemany: bulk_update
+    строит CASE WHEN на каждую строку и в разы медленнее. UPDATE идёт
+    мимо сигналов, поэтому кэш сбрасывается здесь же: updated сдвигается
+    ради карточек, а теги постов пачки, их авторов и групп и feed:index —
+    ради лент и страниц. Возвращает число постов.
+    """
+    batch_size = batch_size or settings.POST_RENDER_SETINGS['BATCH_SIZE']
+    meta = posts.model._meta
+    connection = connections[posts.db]
+    quote = connection.ops.quote_name
+    columns = [
+        meta.get_field(name).column for name in (*RENDERED_FIELDS, 'updated')
+    ]
+    sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+        quote(meta.db_table),
+        ', '.join(f'{quote(column)} = %s' for column in columns),
+        quote(meta.pk.column),
+    )
+    posts = posts.order_by('pk').values_list(
+        'pk', 'text', 'author_id', 'group_id'
+    )
+    count, last_pk = 0, 0
+    while True:
+        batch = list(posts.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return count
+        updated = meta.get_field('updated').get_db_prep_save(
+            timezone.now(), connection
+        )
+        rows = [
+            (*render_text(text).values(), updated, pk)
+            for pk, text, _, _ in batch
+        ]
+        with transaction.atomic(using=posts.db):
+            with connection.cursor() as cursor:
+                cursor.executemany(sql, rows)
+        tags = {'feed:index'}
+        for pk, _, author_id, group_id in batch:
+            tags.update((f'post:{pk}', f'author:{author_id}'))
+            if group_id:
+                tags.add(f'group:{group_id}')
+        invalidate(*tags)
+        count += len(batch)
+        last_pk = batch[-1][0]
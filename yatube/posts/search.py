@@ -0,0 +1,79 @@
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from .models import LIST_DEFERRED, Post
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def fts_available():
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(query):
+    """Запрос пользователя в безопасное выражение MATCH.
+
+    Каждое слово берётся в кавычки, поэтому операторы FTS5 и
+    непарные кавычки из ввода не ломают запрос. Слова ищутся
+    все сразу (AND) и целиком: поиск по префиксу на коротких
+    словах заставляет ранжировать огромную выборку.
+    """
+    return ' '.join(f'"{token}"' for token in TOKEN_RE.findall(query))
+
+
+def matching_ids(query):
+    """RawSQL с id постов, подходящих под запрос, — для pk__in."""
+    return RawSQL(
+        'SELECT rowid FROM posts_post_fts WHERE posts_post_fts MATCH %s',
+        (match_expression(query),),
+    )
+
+
+def encode_cursor(rank, pk):
+    return urlsafe_base64_encode(force_bytes(f'{rank!r}|{pk}'))
+
+
+def decode_cursor(token):
+    try:
+        rank, pk = urlsafe_base64_decode(token).decode().split('|')
+        return float(rank), int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        return None
+
+
+def search_posts(query, per_page, cursor=None):
+    """Страница результатов, лучшие по bm25 первыми.
+
+    Пагинация keyset по паре (rank, id): следующая страница — одна
+    выборка из индекса FTS5 без OFFSET. Возвращает (посты, курсор
+    следующей страницы или None).
+    """
+    expression = match_expression(query)
+    if not expression:
+        return [], None
+    sql = (
+        'SELECT rowid, rank FROM posts_post_fts '
+        'WHERE posts_post_fts MATCH %s'
+    )
+    params = [expression]
+    key = decode_cursor(cursor) if cursor else None
+    if key is not None:
+        sql += ' AND (rank > %s OR (rank = %s AND rowid > %s))'
+        params += [key[0], key[0], key[1]]
+    sql += ' ORDER BY rank, rowid LIMIT %s'
+    params.append(per_page + 1)
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(sql, params)
+        rows = db_cursor.fetchall()
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][0])
+    posts = Post.objects.select_related('author', 'group').defer(
+        *LIST_DEFERRED
+    ).in_bulk([pk for pk, rank in rows])
+    return [posts[pk] for pk, rank in rows if pk in posts], next_cursor
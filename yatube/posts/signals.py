@@ -0,0 +1,184 @@
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.cache_tags import invalidate
+from core.thumbnails import schedule_post, thumbnail_ready
+
+from . import stats, timeline
+from .feed_cache import forget_feed_counts
+from .models import Comment, Follow, Group, Post, User
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.backfill(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    timeline.prune(instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_feed_counts(sender, instance, **kwargs):
+    # Раньше invalidate_post: старая группа ещё в _initial_group_id.
+    forget_feed_counts(instance)
+
+
+@receiver(post_init, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    # Группа до правки: её кэш тоже надо сбросить. Отложенное поле
+    # не трогаем, чтобы не догружать его запросом.
+    instance._initial_group_id = instance.__dict__.get('group_id')
+
+
+def post_tags_changed(post):
+    tags = {'feed:index', f'post:{post.pk}', f'author:{post.author_id}'}
+    for group_id in (post.group_id, post._initial_group_id):
+        if group_id:
+            tags.add(f'group:{group_id}')
+    return tags
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post(sender, instance, **kwargs):
+    invalidate(*post_tags_changed(instance))
+    instance._initial_group_id = instance.group_id
+
+
+@receiver(thumbnail_ready)
+def invalidate_post_thumbnail(sender, name, **kwargs):
+    # В закэшированной разметке вместо миниатюры стоит оригинал. Ленты
+    # помечены тегами своих постов, а feed:index — ещё и ETag всех
+    # лент: из-за одной картинки его сбрасывать незачем.
+    for post in Post.objects.filter(image=name).only(
+        'pk', 'author_id', 'group_id'
+    ):
+        invalidate(*post_tags_changed(post) - {'feed:index'})
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment(sender, instance, **kwargs):
+    invalidate(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group(sender, instance, **kwargs):
+    # feed:index входит и в ETag всех лент (posts.conditional).
+    invalidate(f'group:{instance.pk}', 'feed:index')
+
+
+@receiver(post_init, sender=Group)
+def remember_group_slug(sender, instance, **kwargs):
+    instance._initial_slug = instance.__dict__.get('slug')
+
+
+@receiver(post_save, sender=Group)
+def touch_group_posts(sender, instance, created, raw=False, **kwargs):
+    # Карточка поста кэшируется по его updated, а из группы в ней
+    # только ссылка по slug: правка названия или описания карточек
+    # не меняет.
+    if not (created or raw) and instance.slug != instance._initial_slug:
+        Post.objects.filter(group=instance).update(updated=timezone.now())
+    instance._initial_slug = instance.slug
+
+
+@receiver(pre_delete, sender=Group)
+def touch_deleted_group_posts(sender, instance, **kwargs):
+    # Пока посты ещё в группе: SET_NULL обновит их без save().
+    Post.objects.filter(group=instance).update(updated=timezone.now())
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow(sender, instance, **kwargs):
+    # Счётчики подписчиков и подписок видны в профилях обоих.
+    invalidate(f'author:{instance.author_id}', f'author:{instance.user_id}')
+
+
+@receiver(post_delete, sender=User)
+def invalidate_author(sender, instance, **kwargs):
+    invalidate(f'author:{instance.pk}', 'feed:index')
+
+
+AUTHOR_NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def author_name(user):
+    # Отложенные поля не догружаем: их значение неизвестно.
+    return tuple(user.__dict__.get(field) for field in AUTHOR_NAME_FIELDS)
+
+
+@receiver(post_init, sender=User)
+def remember_author_name(sender, instance, **kwargs):
+    instance._initial_name = author_name(instance)
+
+
+@receiver(post_save, sender=User)
+def author_renamed(sender, instance, created, raw=False, **kwargs):
+    # Имя автора — в шапке профиля, в лентах и в карточке каждого его
+    # поста (см. touch_group_posts). Прочие правки (вход, пароль, почта)
+    # страниц не меняют, а у нового пользователя их ещё нет: сброс
+    # feed:index на каждой регистрации вытеснял бы весь кэш лент.
+    name = author_name(instance)
+    if not created and name != instance._initial_name:
+        if not raw:
+            Post.objects.filter(author=instance).update(
+                updated=timezone.now()
+            )
+        invalidate(f'author:{instance.pk}', 'feed:index')
+    instance._initial_name = name
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.change_profile(instance.author_id, 'posts_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    stats.change_profile(instance.author_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.change_profile(instance.author_id, 'followers_count', 1)
+        stats.change_profile(instance.user_id, 'following_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    stats.change_profile(instance.author_id, 'followers_count', -1)
+    stats.change_profile(instance.user_id, 'following_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.change_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    stats.change_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Post)
+def pregenerate_thumbnails(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_post(instance)
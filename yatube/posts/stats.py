@@ -0,0 +1,88 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from core.cache_tags import invalidate
+
+from .models import Comment, Follow, Post, ProfileStats, User
+
+
+def _count(queryset, field, ref='pk'):
+    """Подзапрос COUNT(*) по строкам queryset, где field = внешний ref."""
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef(ref)})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    ), 0)
+
+
+def user_counts(user_id):
+    return {
+        'posts_count': Post.objects.filter(author_id=user_id).count(),
+        'followers_count': Follow.objects.filter(author_id=user_id).count(),
+        'following_count': Follow.objects.filter(user_id=user_id).count(),
+    }
+
+
+def change_profile(user_id, field, delta):
+    """Атомарно сдвигает счётчик профиля на delta через F()."""
+    updated = ProfileStats.objects.filter(user_id=user_id).update(
+        **{field: F(field) + delta}
+    )
+    # Строки ещё нет — заводим её по честному пересчёту, который уже
+    # учитывает текущую запись. При удалении строку не создаём: так
+    # каскадное удаление пользователя не оставит висячих счётчиков.
+    if not updated and delta > 0:
+        ProfileStats.objects.get_or_create(
+            user_id=user_id, defaults=user_counts(user_id)
+        )
+
+
+def change_comments(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comment_count=F('comment_count') + delta
+    )
+
+
+def recount():
+    """Пересчитывает все счётчики по исходным таблицам.
+
+    Закэшированные профили и посты, чьи счётчики разошлись, сбрасываются.
+    """
+    profile_counts = {
+        'posts_count': _count(Post.objects.all(), 'author', 'user_id'),
+        'followers_count': _count(Follow.objects.all(), 'author', 'user_id'),
+        'following_count': _count(Follow.objects.all(), 'user', 'user_id'),
+    }
+    comment_count = _count(Comment.objects.all(), 'post')
+    with transaction.atomic():
+        ProfileStats.objects.bulk_create(
+            [
+                ProfileStats(user_id=user_id)
+                for user_id in User.objects.filter(
+                    stats__isnull=True
+                ).values_list('pk', flat=True)
+            ],
+            batch_size=500,
+        )
+        drifted_users = ProfileStats.objects.annotate(**{
+            f'actual_{field}': count
+            for field, count in profile_counts.items()
+        }).exclude(**{
+            field: F(f'actual_{field}') for field in profile_counts
+        }).values_list('user_id', flat=True)
+        drifted_posts = Post.objects.annotate(
+            actual_comment_count=comment_count
+        ).exclude(
+            comment_count=F('actual_comment_count')
+        ).values_list('pk', flat=True)
+        tags = [
+            *(f'author:{user_id}' for user_id in drifted_users),
+            *(f'post:{post_id}' for post_id in drifted_posts),
+        ]
+        ProfileStats.objects.update(**profile_counts)
+        Post.objects.update(comment_count=comment_count)
+        if tags:
+            invalidate(*tags)
@@ -1,12 +1,16 @@
 import shutil
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.db import IntegrityError
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
 from django.urls import reverse
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 
+from core.writer import write
 from posts.forms import PostForm, CommentForm
 from posts.models import Group, Post, Comment
 
@@ -14,6 +18,7 @@ User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostCreateFormTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -83,6 +88,33 @@ class PostCreateFormTests(TestCase):
             ).exists()
         )
 
+    def test_same_image_stored_once(self):
+        """Одинаковые картинки хранятся одним файлом, метаданные заполнены."""
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        for name in ('first.gif', 'second.gif'):
+            self.authorized_client.post(
+                reverse('posts:create'),
+                data={
+                    'text': name,
+                    'image': SimpleUploadedFile(
+                        name=name, content=small_gif, content_type='image/gif'
+                    ),
+                },
+            )
+        first = Post.objects.get(text='first.gif')
+        second = Post.objects.get(text='second.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual((first.image_width, first.image_height), (2, 1))
+        self.assertEqual(first.image_size, len(small_gif))
+        self.assertEqual(len(first.image_hash), 64)
+
     def test_create_edit_post(self):
         """Валидная форма изменяет запись в Post."""
         edited_post = 'Исправленный текст'
@@ -156,3 +188,47 @@ class CommentCreateFormTests(TestCase):
                 text=text,
             ).exists()
         )
+
+
+@override_settings(WRITER_SETINGS={
+    **settings.WRITER_SETINGS, 'ENABLED': True, 'MAX_DELAY': 0.05,
+})
+class WriterTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='StasBasov')
+        self.post = Post.objects.create(
+            text='Тестовый текст', author=self.user
+        )
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_comment_through_writer(self):
+        """Комментарий из формы записывается потоком записи."""
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            data={'text': 'Через очередь'},
+        )
+        self.assertTrue(
+            Comment.objects.filter(text='Через очередь').exists()
+        )
+
+    def test_failed_write_does_not_break_batch(self):
+        """Ошибка одной записи пачки не откатывает остальные."""
+        def create(text):
+            return write(Comment.objects.create, post=self.post,
+                         author=self.user, text=text)
+
+        def fail():
+            return write(Comment.objects.create, post_id=0,
+                         author=self.user, text='Нет поста')
+
+        with ThreadPoolExecutor(4) as executor:
+            created = [executor.submit(create, str(n)) for n in range(3)]
+            failed = executor.submit(fail)
+        self.assertEqual(
+            sorted(future.result().text for future in created),
+            ['0', '1', '2'],
+        )
+        with self.assertRaises(IntegrityError):
+            failed.result()
+        self.assertEqual(Comment.objects.count(), 3)
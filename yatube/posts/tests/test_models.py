@@ -1,7 +1,16 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import F, Value as V
+from django.db.models.functions import Concat
+from django.template.defaultfilters import truncatewords
 from django.test import TestCase
 
-from ..models import Group, Post
+from core.cache_tags import tag_versions
+
+from .. import stats
+from ..models import Comment, Follow, Group, Post, ProfileStats
 
 User = get_user_model()
 
@@ -53,3 +62,133 @@ class PostModelTest(TestCase):
         post = PostModelTest.post
         expected_object_name = post.text[:15]
         self.assertEqual(expected_object_name, str(post))
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются вместе с постами, подписками и комментариями."""
+        post = Post.objects.create(author=self.user, text='Текст')
+        Post.objects.create(author=self.user, text='Ещё текст')
+        Follow.objects.create(user=self.reader, author=self.user)
+        Comment.objects.create(post=post, author=self.reader, text='Да')
+        post.delete()
+        stats = ProfileStats.objects.get(user=self.user)
+        self.assertEqual(stats.posts_count, 1)
+        self.assertEqual(stats.followers_count, 1)
+        self.assertEqual(
+            ProfileStats.objects.get(user=self.reader).following_count, 1
+        )
+        Follow.objects.all().delete()
+        stats.refresh_from_db()
+        self.assertEqual(stats.followers_count, 0)
+
+    def test_comment_count(self):
+        """comment_count поста растёт с каждым комментарием."""
+        post = Post.objects.create(author=self.user, text='Текст')
+        Comment.objects.create(post=post, author=self.reader, text='Да')
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+
+    def test_recount(self):
+        """Команда recount исправляет разошедшиеся счётчики."""
+        post = Post.objects.create(author=self.user, text='Текст')
+        Comment.objects.create(post=post, author=self.reader, text='Да')
+        ProfileStats.objects.update(posts_count=42)
+        Post.objects.update(comment_count=42)
+        call_command('recount', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(
+            ProfileStats.objects.get(user=self.user).posts_count, 1
+        )
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(
+            ProfileStats.objects.get(user=self.reader).posts_count, 0
+        )
+
+    def test_recount_resets_drifted_cache(self):
+        """recount сбрасывает кэш только разошедшихся профилей и постов."""
+        post = Post.objects.create(author=self.user, text='Текст')
+        ProfileStats.objects.filter(user=self.user).update(posts_count=42)
+        Post.objects.filter(pk=post.pk).update(comment_count=42)
+        tags = [
+            f'author:{self.user.pk}',
+            f'author:{self.reader.pk}',
+            f'post:{post.pk}',
+        ]
+        before = tag_versions(tags)
+        stats.recount()
+        after = tag_versions(tags)
+        self.assertGreater(after[tags[0]], before[tags[0]])
+        self.assertEqual(after[tags[1]], before[tags[1]])
+        self.assertGreater(after[tags[2]], before[tags[2]])
+
+
+class RenderedTextTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    def test_rendered_on_save(self):
+        """HTML, начало текста и заголовок считаются при сохранении."""
+        text = '<b>Первая</b>\n' + 'слово ' * 400
+        post = Post.objects.create(author=self.user, text=text)
+        self.assertTrue(post.text_html.startswith(
+            '&lt;b&gt;Первая&lt;/b&gt;<br>'
+        ))
+        self.assertEqual(len(post.preview), 300)
+        self.assertEqual(post.title, truncatewords(text, 30))
+        post.text = 'Короткий'
+        post.save(update_fields=['text'])
+        post.refresh_from_db()
+        self.assertEqual(
+            (post.text_html, post.preview, post.title),
+            ('Короткий', 'Короткий', 'Короткий'),
+        )
+
+    def test_rendered_on_update(self):
+        """update() текста тоже пересчитывает производные поля."""
+        post = Post.objects.create(author=self.user, text='Текст')
+        updated = post.updated
+        Post.objects.filter(pk=post.pk).update(text='Новый\nтекст')
+        post.refresh_from_db()
+        self.assertEqual(post.text_html, 'Новый<br>текст')
+        self.assertGreater(post.updated, updated)
+        updated = post.updated
+        Post.objects.filter(pk=post.pk).update(text=Concat(F('text'), V('!')))
+        post.refresh_from_db()
+        self.assertEqual(post.title, 'Новый текст!')
+        self.assertGreater(post.updated, updated)
+
+    def test_render_posts(self):
+        """Команда render_posts заполняет пустые поля."""
+        post = Post.objects.create(author=self.user, text='Текст')
+        Post.objects.update(text_html='', preview='', title='')
+        call_command('render_posts', '--missing', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(
+            (post.text_html, post.preview, post.title),
+            ('Текст', 'Текст', 'Текст'),
+        )
+
+    def test_render_posts_resets_tags(self):
+        """Пересчёт сбрасывает теги постов, авторов, групп и ленты."""
+        group = Group.objects.create(title='Группа', slug='group')
+        post = Post.objects.create(author=self.user, text='Текст', group=group)
+        tags = [
+            'feed:index',
+            f'post:{post.pk}',
+            f'author:{self.user.pk}',
+            f'group:{group.pk}',
+        ]
+        before = tag_versions(tags)
+        call_command('render_posts', stdout=StringIO())
+        after = tag_versions(tags)
+        for tag in tags:
+            self.assertNotEqual(after[tag], before[tag], tag)
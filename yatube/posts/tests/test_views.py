@@ -1,17 +1,37 @@
+import json
 import shutil
 import tempfile
+import time
+
+from io import StringIO
+from urllib.parse import urlencode
+from unittest import mock
 
 import datetime as dt
 
 from django import forms
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
 from django.urls import reverse
+from django.utils.http import http_date
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from sorl.thumbnail import default, get_thumbnail
 
-from posts.models import Group, Post, Follow
+from core.cache_tags import TAG_KEY, invalidate, is_fresh, tag_versions
+from core.paginators import FeedPaginator
+from core.query_budget import QueryBudgetExceeded, QueryBudgetMixin
+from core.stampede import LOCK_KEY
+from core import thumbnails
+from core.thumbnails import thumbnail_ready, thumbnail_urls
+from posts.models import Comment, Group, Post, Follow, Timeline
+from yatube.settings import PAGINATOR_SETINGS
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -258,6 +278,143 @@ class PostPagesTests(TestCase):
         )
         self.assertEqual(len(response.context['page_obj']), 3)
 
+    def test_index_cursor_pagination(self):
+        """Лента листается по курсорам вперёд и назад."""
+        number_of_post = 12
+        for i in range(number_of_post):
+            Post.objects.create(
+                text=f'Testtext_{i}',
+                author=self.user,
+                group=self.group,
+            )
+        response = self.client.get(reverse('posts:index'))
+        first_page = response.context['page_obj']
+        self.assertEqual(len(first_page), 10)
+        self.assertIsNone(first_page.previous_cursor)
+        response = self.client.get(
+            reverse('posts:index') + f'?cursor={first_page.next_cursor}'
+        )
+        second_page = response.context['page_obj']
+        self.assertEqual(len(second_page), 3)
+        self.assertIsNone(second_page.next_cursor)
+        response = self.client.get(
+            reverse('posts:index') + f'?cursor={second_page.previous_cursor}'
+        )
+        self.assertEqual(
+            list(response.context['page_obj']), list(first_page)
+        )
+
+    def test_index_broken_cursor(self):
+        """Битый курсор отдаёт первую страницу ленты."""
+        response = self.client.get(reverse('posts:index') + '?cursor=xyz')
+        self.assertEqual(response.context['page_obj'][0], self.post)
+
+    def test_post_detail_comments_pages(self):
+        """Комментарии выводятся порциями, остальные — через фрагмент."""
+        for i in range(25):
+            Comment.objects.create(
+                post=self.post, author=self.user, text=f'Коммент {i}'
+            )
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
+        comments = response.context['comments']
+        self.assertEqual(len(comments), 20)
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.id})
+            + f'?cursor={comments.next_cursor}'
+        )
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        self.assertEqual(len(response.context['comments']), 5)
+        self.assertIsNone(response.context['comments'].next_cursor)
+
+    def test_search(self):
+        """Поиск находит посты по словам, лучшие совпадения первыми."""
+        for i in range(11):
+            Post.objects.create(text=f'Котики {i}', author=self.user)
+        best = Post.objects.create(
+            text='котики котики котики', author=self.user
+        )
+        Post.objects.create(text='Собаки', author=self.user)
+        response = self.client.get(reverse('posts:search'), {'q': 'котики'})
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), 10)
+        self.assertEqual(page_obj[0], best)
+        response = self.client.get(
+            reverse('posts:search'),
+            {'q': 'котики', 'cursor': page_obj.next_cursor},
+        )
+        self.assertEqual(len(response.context['page_obj']), 2)
+        Post.objects.filter(pk=best.pk).update(text='Просто текст')
+        response = self.client.get(reverse('posts:search'), {'q': 'котики"'})
+        self.assertNotIn(best, response.context['page_obj'])
+
+    def test_search_fallback_keeps_query(self):
+        """Без FTS5 ссылки на страницы поиска сохраняют запрос."""
+        for i in range(11):
+            Post.objects.create(text=f'Котики {i}', author=self.user)
+        with mock.patch('posts.utils.fts_available', return_value=False):
+            response = self.client.get(
+                reverse('posts:search'), {'q': 'Котики', 'page': 1}
+            )
+        self.assertEqual(len(response.context['page_obj']), 10)
+        self.assertContains(
+            response, f'href="?{urlencode({"q": "Котики"})}&amp;page=2"'
+        )
+
+    def test_conditional_get(self):
+        """Повторный запрос без изменений получает 304."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                Comment.objects.create(
+                    post=self.post, author=self.user, text='Коммент'
+                )
+                Post.objects.create(
+                    text='Новый', author=self.user, group=self.group
+                )
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_conditional_get_profile_counters(self):
+        """ETag профиля меняется вместе с любым счётчиком в шапке."""
+        url = reverse('posts:profile', args=[self.user.username])
+        other = User.objects.create_user(username='other')
+        etag = self.authorized_client.get(url)['ETag']
+        Follow.objects.create(user=self.user, author=other)
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_feeds_without_last_modified(self):
+        """Ленты сверяются только по ETag, If-Modified-Since не даёт 304"""
+        url = reverse('posts:index')
+        response = self.authorized_client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        response = self.authorized_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=http_date()
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_conditional_get_post_edit(self):
+        """Правка поста сдвигает Last-Modified его страницы."""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        modified = self.authorized_client.get(url)['Last-Modified']
+        Post.objects.filter(pk=self.post.pk).update(
+            updated=self.post.updated + dt.timedelta(hours=1)
+        )
+        response = self.authorized_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=modified
+        )
+        self.assertEqual(response.status_code, 200)
+
     def test_index_post_view(self):
         """На главной странице отображаются посты."""
         groups_posts = PostPagesTests.group
@@ -312,11 +469,105 @@ class PostPagesTests(TestCase):
         cache.clear()
         text_cache = self.post.text
         self.assertIn(text_cache, response_page())
-        Post.objects.filter(text=text_cache).delete()
+        # update() не шлёт сигналов — страница остаётся в кэше.
+        Post.objects.filter(text=text_cache).update(text='Другой текст')
         self.assertIn(text_cache, response_page())
         cache.clear()
         self.assertNotIn(text_cache, response_page())
 
+    def test_cache_invalidation(self):
+        """Удаление поста сразу сбрасывает кэш главной страницы"""
+        cache.clear()
+        text_cache = self.post.text
+        self.assertIn(
+            text_cache,
+            self.client.get(reverse('posts:index')).content.decode()
+        )
+        Post.objects.filter(text=text_cache).delete()
+        self.assertNotIn(
+            text_cache,
+            self.client.get(reverse('posts:index')).content.decode()
+        )
+
+    def test_cache_per_page(self):
+        """Каждая страница главной кэшируется отдельно"""
+        for i in range(12):
+            Post.objects.create(text=f'Testtext_{i}', author=self.user)
+        cache.clear()
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('posts:index') + '?page=2')
+        self.assertIn(self.post.text, response.content.decode())
+
+    def test_page_window(self):
+        """Номера страниц показываются окном вокруг текущей."""
+        paginator = FeedPaginator(Post.objects.all(), 1, window=2)
+        paginator.__dict__['count'] = 120
+        self.assertEqual(
+            paginator.page_window(6), [1, None, 4, 5, 6, 7, 8, None, 120]
+        )
+        self.assertEqual(paginator.page_window(1), [1, 2, 3, None, 120])
+        self.assertEqual(
+            paginator.page_window(4), [1, 2, 3, 4, 5, 6, None, 120]
+        )
+        self.assertEqual(paginator.page_window(120), [1, None, 118, 119, 120])
+        for i in range(59):
+            Post.objects.create(text=f'Testtext_{i}', author=self.user)
+        cache.clear()
+        response = self.client.get(reverse('posts:index') + '?page=3')
+        self.assertEqual(
+            response.context['page_obj'].page_window, [1, 2, 3, 4, 5, 6]
+        )
+        cache.clear()
+        with mock.patch.dict(PAGINATOR_SETINGS, {'PAGE_WINDOW': 1}):
+            response = self.client.get(reverse('posts:index') + '?page=3')
+        self.assertEqual(
+            response.context['page_obj'].page_window, [1, 2, 3, 4, None, 6]
+        )
+        self.assertContains(response, '&hellip;')
+
+    def test_feed_count_cached(self):
+        """COUNT(*) ленты берётся из кэша и сбрасывается новым постом."""
+        cache.clear()
+        url = reverse('posts:group_posts', kwargs={'slug': self.group.slug})
+        response = self.client.get(url + '?page=1')
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url + '?page=1')
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries.captured_queries)
+        )
+        Post.objects.create(
+            text='Ещё пост', author=self.user, group=self.group
+        )
+        response = self.client.get(url + '?page=1')
+        self.assertEqual(response.context['page_obj'].paginator.count, 2)
+
+    def test_feed_count_forgotten_for_old_group(self):
+        """Пост, ушедший в другую группу, сбрасывает и счёт старой."""
+        cache.clear()
+        url = reverse('posts:group_posts', kwargs={'slug': self.group.slug})
+        response = self.client.get(url + '?page=1')
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = Group.objects.create(title='Другая', slug='other')
+        post.save()
+        response = self.client.get(url + '?page=1')
+        self.assertEqual(response.context['page_obj'].paginator.count, 0)
+
+    def test_feed_count_estimated(self):
+        """Большая таблица считается оценкой по крайним id."""
+        cache.clear()
+        extra = Post.objects.create(text='Удалённый', author=self.user)
+        last = Post.objects.create(text='Крайний', author=self.user)
+        Post.objects.filter(pk=extra.pk).delete()
+        expected = last.pk - self.post.pk + 1
+        with mock.patch.dict(PAGINATOR_SETINGS, {'ESTIMATE_ABOVE': 1}):
+            response = self.client.get(reverse('posts:index') + '?page=1')
+        self.assertEqual(
+            response.context['page_obj'].paginator.count, expected
+        )
+        self.assertEqual(Post.objects.count(), expected - 1)
+
     def test_follow_user(self):
         '''Тестирование возможности подписаться и отписаться'''
         follower_count = Follow.objects.count()
@@ -364,3 +615,565 @@ class PostPagesTests(TestCase):
         first_object = response.context['page_obj']
 
         self.assertNotEqual(first_object, new_post)
+
+    def test_rebuild_timeline(self):
+        '''Команда rebuild_timeline восстанавливает ленту подписок'''
+        Follow.objects.create(
+            user=self.user, author=self.user
+        )
+        Timeline.objects.all().delete()
+        call_command('rebuild_timeline', stdout=StringIO())
+        response = self.authorized_client.get(
+            reverse('posts:follow_index')
+        )
+        self.assertEqual(response.context['page_obj'][0], self.post)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='StasBasov')
+        cls.post = Post.objects.create(
+            text='Тестовый текст',
+            author=cls.user,
+            image=SimpleUploadedFile(
+                name='small.gif',
+                content=(
+                    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+                    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+                    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+                    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+                    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+                    b'\x0A\x00\x3B'
+                ),
+                content_type='image/gif'
+            ),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_thumbnail_falls_back_to_original(self):
+        """Пока миниатюры нет, отдаётся оригинал; готовая берётся из кэша"""
+        image = self.post.image
+        options = {'crop': 'center', 'upscale': True}
+        pending = get_thumbnail(image, '960x339', **options)
+        self.assertEqual(pending.name, image.name)
+        created = default.backend.generate(image, '960x339', **options)
+        ready = get_thumbnail(image, '960x339', **options)
+        self.assertNotEqual(ready.name, image.name)
+        self.assertEqual(ready.name, created.name)
+
+    def test_batch_thumbnail_urls(self):
+        """Миниатюры страницы ищутся одним запросом, повторно — из LRU"""
+        image = self.post.image
+        options = {'crop': 'center', 'upscale': True}
+        created = default.backend.generate(image, '960x339', **options)
+        cache.clear()
+        with self.assertNumQueries(1):
+            urls = thumbnail_urls([image, image], '960x339', **options)
+        self.assertEqual(urls, {image.name: created.url})
+        with self.assertNumQueries(0):
+            thumbnail_urls([image], '960x339', **options)
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    THUMBNAIL_SETINGS={**settings.THUMBNAIL_SETINGS, 'WORKERS': 1},
+)
+class ThumbnailPoolTests(TransactionTestCase):
+    """Фоновый пул миниатюр: потокам нужна закоммиченная база."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self):
+        return Post.objects.create(
+            text='Тестовый текст',
+            author=User.objects.create_user(username='StasBasov'),
+            image=SimpleUploadedFile(
+                name='pool.gif',
+                content=(
+                    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+                    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+                    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+                    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+                    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+                    b'\x0A\x00\x3B'
+                ),
+                content_type='image/gif',
+            ),
+        )
+
+    def assertThumbnailReady(self, image):
+        ready = get_thumbnail(image, '960x339', crop='center', upscale=True)
+        self.assertNotEqual(ready.name, image.name)
+
+    def test_pool_generates_after_commit(self):
+        """После коммита поста миниатюру готовит фоновый пул"""
+        cache.clear()
+        with mock.patch.object(thumbnails, '_executor', None):
+            post = self.create_post()
+            thumbnails.get_executor().shutdown(wait=True)
+        self.assertThumbnailReady(post.image)
+
+    def test_ready_sent_for_new_thumbnail_only(self):
+        """thumbnail_ready приходит, только когда миниатюра создана"""
+        cache.clear()
+        with mock.patch('core.thumbnails.transaction.on_commit'):
+            post = self.create_post()
+        names = []
+
+        def receiver(sender, name, **kwargs):
+            names.append(name)
+
+        thumbnail_ready.connect(receiver)
+        self.addCleanup(thumbnail_ready.disconnect, receiver)
+        with override_settings(THUMBNAIL_SETINGS={
+            **settings.THUMBNAIL_SETINGS, 'WORKERS': 0,
+        }):
+            for _ in range(2):
+                thumbnails.schedule(
+                    post.image, '960x339', crop='center', upscale=True
+                )
+        self.assertEqual(names, [post.image.name])
+
+    def test_generate_thumbnails_command(self):
+        """Миниатюры из generate_thumbnails находятся шаблонами"""
+        with mock.patch('core.thumbnails.transaction.on_commit'):
+            post = self.create_post()
+        cache.clear()
+        call_command('generate_thumbnails', workers=1, stdout=StringIO())
+        self.assertThumbnailReady(post.image)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BenchmarkCommandsTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_generate_data_and_benchmark(self):
+        """generate_data наполняет базу, benchmark_views обходит маршруты"""
+        index = reverse('posts:index')
+        self.assertNotContains(self.client.get(index), 'подробная информация')
+        call_command(
+            'generate_data', posts=200, groups=3, images=2,
+            stdout=StringIO(),
+        )
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertContains(self.client.get(index), 'подробная информация')
+        self.assertTrue(Follow.objects.exists())
+        self.assertEqual(
+            Timeline.objects.count(),
+            sum(
+                Post.objects.filter(author=follow.author).count()
+                for follow in Follow.objects.all()
+            )
+        )
+        output = StringIO()
+        cache.clear()
+        call_command(
+            'benchmark_views', repeat=2, warmup=0,
+            stdout=output, stderr=StringIO(),
+        )
+        # Замер шёл в своём кэше, общий остался пустым.
+        self.assertIsNone(cache.get(TAG_KEY.format(tag='feed:index')))
+        views = json.loads(output.getvalue())['views']
+        self.assertIn('posts:index', views)
+        self.assertIn('about:tech', views)
+        self.assertEqual(views['posts:index']['status'], 200)
+        self.assertGreater(views['posts:index']['queries'], 0)
+
+    def test_generate_data_after_deletes(self):
+        """Повторный generate_data после удалений не путает строки"""
+        call_command('generate_data', posts=50, groups=3, images=0,
+                     stdout=StringIO())
+        User.objects.filter(username='user0').delete()
+        Group.objects.filter(slug='group-0').delete()
+        Post.objects.order_by('-pk')[:1].get().delete()
+        before = Post.objects.count()
+        call_command('generate_data', posts=50, groups=3, images=0,
+                     stdout=StringIO())
+        self.assertEqual(Post.objects.count(), before + 50)
+        self.assertFalse(
+            Comment.objects.exclude(post__in=Post.objects.all()).exists()
+        )
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for number in range(15):
+            post = Post.objects.create(
+                text=f'Пост номер {number}', author=cls.author,
+                group=cls.group,
+            )
+            commenter = User.objects.create_user(username=f'commenter{number}')
+            Comment.objects.create(post=post, author=commenter, text='Да')
+            Comment.objects.create(post=post, author=cls.author, text='Нет')
+        cls.post = post
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def test_pages_within_budget(self):
+        """Страницы укладываются в бюджет запросов с пустым кэшем"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:index') + '?page=2',
+            reverse('posts:group_posts', kwargs={'slug': 'group'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+            reverse('posts:follow_index'),
+            reverse('posts:search') + '?q=пост',
+            reverse('posts:create'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertQueryBudget(url)
+        author = Client()
+        author.force_login(self.author)
+        self.assertQueryBudget(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+            client=author,
+        )
+
+    def test_writes_within_budget(self):
+        """Запись поста, комментария и подписки укладывается в бюджет"""
+        self.assertQueryBudget(
+            reverse('posts:create'), {'text': 'Новый пост'}, method='post'
+        )
+        self.assertQueryBudget(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Комментарий'},
+            method='post',
+        )
+        self.assertQueryBudget(reverse(
+            'posts:profile_unfollow', kwargs={'username': 'author'}
+        ))
+        self.assertQueryBudget(reverse(
+            'posts:profile_follow', kwargs={'username': 'author'}
+        ))
+
+    @override_settings(QUERY_BUDGET_SETINGS={
+        'ENABLED': True, 'DEFAULT': None, 'VIEWS': {'posts:index': 0},
+    })
+    def test_middleware_fails_on_overrun(self):
+        """Middleware падает, когда представление выходит за бюджет"""
+        with self.assertRaises(QueryBudgetExceeded):
+            Client().get(reverse('posts:index'))
+
+    @override_settings(QUERY_BUDGET_SETINGS={
+        'ENABLED': False, 'DEFAULT': None, 'VIEWS': {'posts:index': 1},
+    })
+    def test_helper_fails_on_overrun(self):
+        """Бюджет из настроек важнее декоратора и ловится в тестах"""
+        with self.assertRaises(AssertionError):
+            self.assertQueryBudget(reverse('posts:index'))
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='StasBasov')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый текст', author=cls.user, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_hit_skips_database(self):
+        """Повторный анонимный запрос отдаётся из кэша без базы"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_posts', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.user.username]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                with self.assertNumQueries(0):
+                    second = self.client.get(url)
+                self.assertEqual(second.content, first.content)
+                self.assertIn('public', second['Cache-Control'])
+                self.assertIn('max-age=', second['Cache-Control'])
+                self.assertIn('Cookie', second['Vary'])
+
+    def test_authorized_not_cached(self):
+        """Вошедшему пользователю страница не отдаётся из кэша"""
+        client = Client()
+        client.force_login(self.user)
+        client.get(reverse('posts:index'))
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse('posts:index'))
+        self.assertTrue(queries.captured_queries)
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_invalidated_by_writes(self):
+        """Пост, комментарий и группа сбрасывают только страницы с ними"""
+        other_group = Group.objects.create(title='Другая', slug='other')
+        other_url = reverse('posts:group_posts', args=[other_group.slug])
+        group_url = reverse('posts:group_posts', args=[self.group.slug])
+        post_url = reverse('posts:post_detail', args=[self.post.pk])
+        urls = (reverse('posts:index'), group_url, other_url, post_url)
+
+        def cached():
+            result = set()
+            for url in urls:
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(url)
+                if not queries.captured_queries:
+                    result.add(url)
+            return result
+
+        cached()
+        self.assertEqual(cached(), set(urls))
+        Comment.objects.create(post=self.post, author=self.user, text='Ок')
+        self.assertEqual(cached(), set(urls) - {post_url})
+        self.group.description = 'Новое описание'
+        self.group.save()
+        self.assertEqual(cached(), {other_url})
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = other_group
+        post.save()
+        self.assertEqual(cached(), set())
+        self.assertContains(self.client.get(other_url), 'Тестовый текст')
+
+
+class CacheTagsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='StasBasov')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый текст', author=cls.user, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_invalidate_after_read_started(self):
+        """Сброс тега после начала чтения делает его результат старым"""
+        tag_versions(['post:1'])
+        started = time.time()
+        self.assertTrue(is_fresh(['post:1'], started))
+        invalidate('post:1')
+        self.assertFalse(is_fresh(['post:1'], started))
+        self.assertTrue(is_fresh(['post:1'], time.time()))
+
+    def test_user_saves_keep_feed_tags(self):
+        """Регистрация и смена пароля не сбрасывают ленты, смена имени — да"""
+        tags = ['feed:index', f'author:{self.user.pk}']
+        versions = tag_versions(tags)
+        User.objects.create_user(username='Newcomer')
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('new-password')
+        user.save()
+        self.assertEqual(tag_versions(tags), versions)
+        user.first_name = 'Стас'
+        user.save()
+        renamed = tag_versions(tags)
+        for tag in tags:
+            self.assertGreater(renamed[tag], versions[tag])
+
+    def test_header_fragments_follow_writes(self):
+        """Шапки профиля и группы сразу показывают изменения"""
+        profile_url = reverse('posts:profile', args=[self.user.username])
+        group_url = reverse('posts:group_posts', args=[self.group.slug])
+        self.assertContains(
+            self.authorized_client.get(profile_url), 'Подписчиков: 0'
+        )
+        self.assertContains(
+            self.authorized_client.get(group_url), 'Тестовое описание'
+        )
+        Follow.objects.create(user=self.reader, author=self.user)
+        self.group.description = 'Новое описание'
+        self.group.save()
+        self.assertContains(
+            self.authorized_client.get(profile_url), 'Подписчиков: 1'
+        )
+        self.assertContains(
+            self.authorized_client.get(group_url), 'Новое описание'
+        )
+
+    def test_feed_fragment_cached_until_tag_changes(self):
+        """Фрагмент ленты профиля не меняется без сигналов"""
+        url = reverse('posts:profile', args=[self.user.username])
+        self.authorized_client.get(url)
+        # Запись в обход updated: карточка остаётся прежней.
+        Post.objects.filter(pk=self.post.pk).update(
+            text='Без сигнала', updated=self.post.updated
+        )
+        self.assertContains(self.authorized_client.get(url), 'Тестовый текст')
+        Post.objects.get(pk=self.post.pk).save()
+        self.assertContains(self.authorized_client.get(url), 'Без сигнала')
+
+    def test_thumbnail_ready_invalidates_post(self):
+        """Готовая миниатюра сбрасывает теги поста с этой картинкой"""
+        Post.objects.filter(pk=self.post.pk).update(image='posts/a.gif')
+        tags = [f'post:{self.post.pk}', f'group:{self.group.pk}']
+        index = tag_versions(['feed:index'])
+        tag_versions(tags)
+        started = time.time()
+        thumbnail_ready.send(sender=None, name='posts/a.gif')
+        self.assertFalse(any(
+            version < started for version in tag_versions(tags).values()
+        ))
+        self.assertEqual(tag_versions(['feed:index']), index)
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='StasBasov')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый текст', author=cls.user, group=cls.group
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+        self.url = reverse('posts:follow_index')
+
+    def test_card_cached_until_post_updated(self):
+        """Карточка поста берётся из кэша, пока не сменится updated"""
+        self.authorized_client.get(self.url)
+        # Запись в обход updated: карточка остаётся прежней.
+        Post.objects.filter(pk=self.post.pk).update(
+            text='Без сигнала', updated=self.post.updated
+        )
+        self.assertContains(self.authorized_client.get(self.url),
+                            'Тестовый текст')
+        post = Post.objects.get(pk=self.post.pk)
+        post.save()
+        self.assertGreater(post.updated, self.post.updated)
+        self.assertContains(self.authorized_client.get(self.url),
+                            'Без сигнала')
+
+    def test_stale_card_not_stored_in_feed(self):
+        """Лента с устаревшей карточкой не кэшируется свежей"""
+        lock = LOCK_KEY.format(
+            key=make_template_fragment_key('post_card', [self.post.pk])
+        )
+        index = reverse('posts:index')
+        clients = (Client(), self.authorized_client)
+        for client in clients:
+            client.get(index)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Новый текст'
+        post.save()
+        # Карточку в это время пересобирает другой воркер.
+        cache.add(lock, 1)
+        for client in clients:
+            self.assertContains(client.get(index), 'Тестовый текст')
+        cache.delete(lock)
+        for client in clients:
+            with self.subTest(client=client):
+                self.assertContains(client.get(index), 'Новый текст')
+
+    def test_group_and_author_changes_touch_cards(self):
+        """Правка группы или автора обновляет карточки их постов"""
+        self.authorized_client.get(self.url)
+        self.group.slug = 'new-slug'
+        self.group.save()
+        self.assertContains(
+            self.authorized_client.get(self.url),
+            reverse('posts:group_posts', args=['new-slug']),
+        )
+        self.user.first_name = 'Стас'
+        self.user.save()
+        self.assertContains(self.authorized_client.get(self.url), 'Стас')
+
+    def test_author_other_changes_keep_cards(self):
+        """Правка автора без смены имени не трогает его посты"""
+        updated = Post.objects.get(pk=self.post.pk).updated
+        self.user.email = 'new@example.com'
+        self.user.set_password('new-password')
+        self.user.save()
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name = user.first_name
+        user.save()
+        self.assertEqual(Post.objects.get(pk=self.post.pk).updated, updated)
+        user.last_name = 'Михайлов'
+        user.save()
+        self.assertGreater(Post.objects.get(pk=self.post.pk).updated, updated)
+
+    def test_group_other_changes_keep_cards(self):
+        """Правка группы без смены slug не трогает её посты"""
+        updated = Post.objects.get(pk=self.post.pk).updated
+        group = Group.objects.get(pk=self.group.pk)
+        group.description = 'Новое описание'
+        group.save()
+        group.save()
+        self.assertEqual(Post.objects.get(pk=self.post.pk).updated, updated)
+        group.slug = 'renamed'
+        group.save()
+        self.assertGreater(Post.objects.get(pk=self.post.pk).updated, updated)
+
+    def test_group_delete_touches_cards(self):
+        """Удаление группы убирает ссылку на неё из карточек"""
+        group = Group.objects.create(title='Удаляемая', slug='gone')
+        Post.objects.filter(pk=self.post.pk).update(group=group)
+        self.authorized_client.get(self.url)
+        group.delete()
+        self.assertNotContains(
+            self.authorized_client.get(self.url),
+            reverse('posts:group_posts', args=['gone']),
+        )
+
+    def test_feeds_defer_text(self):
+        """Ленты не читают полный текст поста, только начало"""
+        for url in (
+            self.url,
+            reverse('posts:index'),
+            reverse('posts:profile', args=[self.user.username]),
+            reverse('posts:group_posts', args=[self.group.slug]),
+        ):
+            with self.subTest(url=url):
+                post = self.authorized_client.get(url).context['page_obj'][0]
+                self.assertTrue(
+                    {'text', 'text_html'} <= post.get_deferred_fields()
+                )
@@ -0,0 +1,65 @@
+from itertools import islice
+
+from django.db import transaction
+
+from .models import Follow, Post, Timeline
+
+from yatube.settings import TIMELINE_SETINGS
+
+
+def _bulk_create(entries):
+    """Пишет строки ленты пачками, не собирая их все в память."""
+    batch_size = TIMELINE_SETINGS['BATCH_SIZE']
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, batch_size))
+        if not batch:
+            break
+        Timeline.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out(post):
+    """Раскладывает новый пост в ленты всех подписчиков автора."""
+    followers = Follow.objects.filter(author_id=post.author_id).values_list(
+        'user_id', flat=True
+    )
+    _bulk_create(
+        Timeline(
+            user_id=user_id,
+            post_id=post.pk,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        )
+        for user_id in followers.iterator()
+    )
+
+
+def backfill(follow):
+    """Добавляет в ленту подписчика уже опубликованные посты автора."""
+    posts = Post.objects.filter(author_id=follow.author_id).values_list(
+        'pk', 'pub_date'
+    )
+    _bulk_create(
+        Timeline(
+            user_id=follow.user_id,
+            post_id=post_id,
+            author_id=follow.author_id,
+            pub_date=pub_date,
+        )
+        for post_id, pub_date in posts.iterator()
+    )
+
+
+def prune(follow):
+    """Убирает из ленты подписчика посты автора после отписки."""
+    Timeline.objects.filter(
+        user_id=follow.user_id, author_id=follow.author_id
+    ).delete()
+
+
+def rebuild():
+    """Перестраивает все ленты с нуля по текущим подпискам."""
+    with transaction.atomic():
+        Timeline.objects.all().delete()
+        for follow in Follow.objects.all().iterator():
+            backfill(follow)
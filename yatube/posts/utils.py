@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+
+from core.paginators import CursorPaginator, FeedPaginator
+from core.thumbnails import thumbnail_urls
+
+from .models import Post
+from .search import fts_available, search_posts
+
+from yatube.settings import PAGINATOR_SETINGS
+
+
+def paginate(request, post_list, **kwargs):
+    """Страница ленты: по курсору, а для старых ссылок — по ?page=N."""
+    paginator = FeedPaginator(
+        post_list,
+        PAGINATOR_SETINGS['PAGE_SIZE'],
+        count_timeout=PAGINATOR_SETINGS['COUNT_TIMEOUT'],
+        estimate_above=PAGINATOR_SETINGS['ESTIMATE_ABOVE'],
+        window=PAGINATOR_SETINGS['PAGE_WINDOW'],
+        **kwargs
+    )
+    page_number = request.GET.get('page')
+    if page_number is not None:
+        return paginator.get_page(page_number)
+    return paginator.get_cursor_page(request.GET.get('cursor'))
+
+
+def paginate_comments(request, post):
+    """Страница комментариев поста по курсору, с авторами одним JOIN."""
+    paginator = CursorPaginator(
+        post.comments.select_related('author'),
+        PAGINATOR_SETINGS['COMMENTS_PAGE_SIZE'],
+        key=('created', 'id'),
+    )
+    return paginator.get_cursor_page(request.GET.get('cursor'))
+
+
+def attach_thumbnails(posts):
+    """Проставляет постам thumbnail_url одним пакетным запросом."""
+    posts = list(posts)
+    geometry_string, options = settings.THUMBNAIL_SETINGS['SIZES']['feed']
+    urls = thumbnail_urls(
+        [post.image for post in posts if post.image],
+        geometry_string,
+        **options
+    )
+    for post in posts:
+        post.thumbnail_url = urls.get(post.image.name) if post.image else None
+
+
+def paginate_search(request, query):
+    """Страница поиска: FTS5 с ранжированием, иначе — LIKE по ленте."""
+    if not fts_available():
+        return paginate(
+            request,
+            Post.objects.select_related('author', 'group').filter(
+                text__icontains=query
+            ),
+        )
+    paginator = Paginator([], PAGINATOR_SETINGS['PAGE_SIZE'])
+    posts, next_cursor = search_posts(
+        query, PAGINATOR_SETINGS['PAGE_SIZE'], request.GET.get('cursor')
+    )
+    page = paginator._get_page(posts, None, paginator)
+    page.previous_cursor = None
+    page.next_cursor = next_cursor
+    return page
@@ -1,62 +1,122 @@
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.http import urlencode
+from django.views.decorators.http import condition
 
+from core.page_cache import cache_anonymous, tag_page
+from core.query_budget import query_budget
+from core.writer import write
+
+from . import conditional
+
+from .feed_cache import feed_count_key, post_tags
 from .forms import PostForm, CommentForm
-from .models import Group, Post, Follow, User
+from .models import LIST_DEFERRED, Group, Post, Follow, User
+from .utils import (attach_thumbnails, paginate, paginate_comments,
+                    paginate_search)
 
-from yatube.settings import PAGINATOR_SETINGS
+from yatube.settings import FEED_CACHE_SETINGS
 
 
+@cache_anonymous
+@query_budget(6)
+@condition(etag_func=conditional.index_etag)
 def index(request):
-    post_list = Post.objects.select_related('author').all()
-    paginator = Paginator(post_list, PAGINATOR_SETINGS['PAGE_SIZE'])
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.select_related('author', 'group').defer(
+        *LIST_DEFERRED
+    )
+    page_obj = paginate(
+        request, post_list, count_key=feed_count_key('index')
+    )
+    attach_thumbnails(page_obj)
+    feed_tags = {'feed:index', *post_tags(page_obj)}
+    tag_page(request, *feed_tags)
     context = {
         'page_obj': page_obj,
+        'feed_tags': feed_tags,
+        'feed_cache_timeout': FEED_CACHE_SETINGS['TIMEOUT'],
     }
     return render(request, 'posts/index.html', context)
 
 
+@cache_anonymous
+@query_budget(6)
+@condition(etag_func=conditional.group_etag)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    paginator = Paginator(post_list, PAGINATOR_SETINGS['PAGE_SIZE'])
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = group.posts.select_related('author').defer(*LIST_DEFERRED)
+    page_obj = paginate(
+        request, post_list, count_key=feed_count_key(f'group:{group.pk}')
+    )
+    attach_thumbnails(page_obj)
+    header_tags = [f'group:{group.pk}']
+    feed_tags = {*header_tags, *post_tags(page_obj)}
+    tag_page(request, *feed_tags)
     context = {
         'page_obj': page_obj,
         'group': group,
+        'header_tags': header_tags,
+        'feed_tags': feed_tags,
+        'feed_cache_timeout': FEED_CACHE_SETINGS['TIMEOUT'],
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@cache_anonymous
+@query_budget(8)
+@condition(etag_func=conditional.profile_etag)
 def profile(request, username):
-    author_profile = get_object_or_404(User, username=username)
-    posts_author = author_profile.posts.all()
-    paginator = Paginator(posts_author, PAGINATOR_SETINGS['PAGE_SIZE'])
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    author = get_object_or_404(User, username=username)
+    author_profile = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    posts_author = author_profile.posts.select_related('group').defer(
+        *LIST_DEFERRED
+    )
+    page_obj = paginate(
+        request,
+        posts_author,
+        count_key=feed_count_key(f'profile:{author_profile.pk}'),
+    )
+    attach_thumbnails(page_obj)
+    header_tags = [f'author:{author_profile.pk}']
+    feed_tags = {*header_tags, *post_tags(page_obj)}
+    tag_page(request, *feed_tags)
     following = False
     if request.user.is_authenticated:
         following = Follow.objects.filter(
             user=request.user,
-            author=author).exists()
+            author=author_profile).exists()
     context = {
-        'author': author,
+        'author': author_profile,
         'page_obj': page_obj,
         'user_profile': author_profile,
         'following': following,
+        'header_tags': header_tags,
+        'feed_tags': feed_tags,
+        'feed_cache_timeout': FEED_CACHE_SETINGS['TIMEOUT'],
     }
     return render(request, 'posts/profile.html', context)
 
 
+@cache_anonymous
+@query_budget(8)
+@condition(
+    etag_func=conditional.post_etag,
+    last_modified_func=conditional.post_last_modified,
+)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group').defer('text'),
+        pk=post_id,
+    )
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
+    comments = paginate_comments(request, post)
+    tag_page(
+        request,
+        f'post:{post.pk}',
+        *post_tags([post]),
+        *(f'author:{comment.author_id}' for comment in comments),
+    )
     context = {
         'post': post,
         'form': form,
@@ -65,6 +125,31 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+@query_budget(2)
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    context = {
+        'post': post,
+        'comments': paginate_comments(request, post),
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+@query_budget(5)
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = paginate_search(request, query)
+    attach_thumbnails(page_obj)
+    context = {
+        'page_obj': page_obj,
+        'feed_cache_timeout': FEED_CACHE_SETINGS['TIMEOUT'],
+        'query': query,
+        'extra_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@query_budget(6)
 @login_required
 def post_create(request):
     form = PostForm(
@@ -74,7 +159,7 @@ def post_create(request):
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        write(post.save)
         return redirect('posts:profile', request.user.username)
     return render(
         request,
@@ -83,6 +168,7 @@ def post_create(request):
     )
 
 
+@query_budget(5)
 @login_required
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
@@ -105,6 +191,7 @@ def post_edit(request, post_id):
     return render(request, 'posts/create.html', context)
 
 
+@query_budget(5)
 @login_required
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
@@ -113,32 +200,39 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        write(comment.save)
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@query_budget(4)
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, PAGINATOR_SETINGS['PAGE_SIZE'])
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    entries = request.user.timeline.select_related(
+        'post__author', 'post__group'
+    ).defer(*(f'post__{field}' for field in LIST_DEFERRED))
+    page_obj = paginate(request, entries, key=('pub_date', 'post_id'))
+    page_obj.object_list = [entry.post for entry in page_obj]
+    attach_thumbnails(page_obj)
     context = {
         'page_obj': page_obj,
+        'feed_cache_timeout': FEED_CACHE_SETINGS['TIMEOUT'],
     }
     return render(request, 'posts/follow.html', context)
 
 
+@query_budget(11)
 @login_required
 def profile_follow(request, username):
     if request.user.username != username:
-        Follow.objects.get_or_create(
+        write(
+            Follow.objects.get_or_create,
             user=request.user,
             author=get_object_or_404(User, username=username)
         )
     return redirect("posts:profile", username=username)
 
 
+@query_budget(8)
 @login_required
 def profile_unfollow(request, username):
     Follow.objects.filter(
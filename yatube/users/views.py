@@ -1,6 +1,9 @@
+from django.http import HttpResponseRedirect
 from django.urls import reverse_lazy
 from django.views.generic import CreateView
 
+from core.writer import write
+
 from .forms import CreationForm
 
 
@@ -8,3 +11,7 @@ class SignUp(CreateView):
     form_class = CreationForm
     success_url = reverse_lazy('posts:index')
     template_name = 'users/signup.html'
+
+    def form_valid(self, form):
+        self.object = write(form.save)
+        return HttpResponseRedirect(self.get_success_url())
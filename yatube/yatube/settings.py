@@ -57,6 +57,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.timing.ServerTimingMiddleware',
+    'core.cache_tags.CacheTagsMiddleware',
+    'core.query_budget.QueryBudgetMiddleware',
+    'core.routers.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -76,7 +81,7 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.templates.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -101,9 +106,82 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Подключение живёт между запросами, а не открывается заново.
+        'CONN_MAX_AGE': 60,
     }
 }
 
+# Реплика для чтения лент, профиля и поста (core.routers). Локально это
+# копия db.sqlite3, которую обновляет python manage.py sync_replica.
+REPLICA_SETINGS = {
+    'ENABLED': False,
+    'ALIAS': 'replica',
+    'APPS': ('posts',),
+    'VIEWS': (
+        'posts:index',
+        'posts:group_posts',
+        'posts:profile',
+        'posts:post_detail',
+        'posts:post_comments',
+        'posts:follow_index',
+        'posts:search',
+    ),
+    # Столько секунд после записи браузер читает с основной базы.
+    'STICKY_SECONDS': 10,
+    # Насколько реплика может отставать: закэшированное по её данным
+    # считается прочитанным на столько секунд раньше (core.cache_tags).
+    'MAX_LAG': 10,
+    'COOKIE': 'read_primary',
+}
+
+if REPLICA_SETINGS['ENABLED']:
+    DATABASES[REPLICA_SETINGS['ALIAS']] = {
+        **DATABASES['default'],
+        'NAME': os.path.join(BASE_DIR, 'db_replica.sqlite3'),
+    }
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# Заголовок Server-Timing с временем БД, шаблонов, кэша и миниатюр
+# (core.timing.ServerTimingMiddleware). Он раскрывает устройство сайта,
+# поэтому включён только при DEBUG и уходит только персоналу и адресам
+# из ALLOWED_IPS. За прокси REMOTE_ADDR у всех один, там список пуст.
+TIMING_SETINGS = {
+    'HEADER': DEBUG,
+    'ALLOWED_IPS': ('127.0.0.1', '::1') if DEBUG else (),
+}
+
+INTERNAL_IPS = ['127.0.0.1', '::1']
+
+# /metrics (core.metrics) отвечает запросу с заголовком
+# "Authorization: Bearer <TOKEN>"; без TOKEN — никому. ALLOWED_IPS
+# пускает адреса без токена, но за прокси REMOTE_ADDR у всех один,
+# поэтому список пуст по умолчанию. Счётчики всех воркеров лежат
+# в общем файле PATH; без него — в памяти процесса.
+METRICS_SETINGS = {
+    'PATH': os.path.join(BASE_DIR, 'metrics.mmap'),
+    'SLOTS': 4096,
+    'TOKEN': os.environ.get('METRICS_TOKEN'),
+    'ALLOWED_IPS': (),
+}
+
+# PRAGMA, которые core.sqlite выполняет на каждом новом подключении.
+# WAL не блокирует читателей на время записи, synchronous=NORMAL
+# в режиме WAL безопасен и не делает fsync на каждый коммит,
+# busy_timeout ждёт блокировку вместо "database is locked".
+# Замерить эффект: python manage.py benchmark_sqlite.
+SQLITE_SETINGS = {
+    'PRAGMAS': {
+        'journal_mode': 'wal',
+        'synchronous': 'normal',
+        'busy_timeout': 5000,
+        'temp_store': 'memory',
+        'mmap_size': 256 * 1024 * 1024,
+        # Отрицательное значение — размер в КиБ, то есть 64 МиБ.
+        'cache_size': -64 * 1024,
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -143,8 +221,65 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+# PAGE_WINDOW — сколько номеров страниц показывать по обе стороны от
+# текущей; COUNT_TIMEOUT — сколько секунд живёт число постов ленты
+# в кэше; для таблиц больше ESTIMATE_ABOVE строк число оценивается.
 PAGINATOR_SETINGS = {
-    'PAGE_SIZE': 10
+    'PAGE_SIZE': 10,
+    'COMMENTS_PAGE_SIZE': 20,
+    'PAGE_WINDOW': 2,
+    'COUNT_TIMEOUT': 60 * 10,
+    'ESTIMATE_ABOVE': 100_000,
+}
+
+TIMELINE_SETINGS = {
+    'BATCH_SIZE': 500
+}
+
+# Производные от текста поста поля (posts.rendering): начало текста
+# для лент — PREVIEW_LENGTH символов, заголовок — TITLE_WORDS слов.
+# После их смены посты пересчитывает команда render_posts.
+POST_RENDER_SETINGS = {
+    'PREVIEW_LENGTH': 300,
+    'TITLE_WORDS': 30,
+    'BATCH_SIZE': 500,
+}
+
+# Фрагменты лент сбрасываются по тегам (core.cache_tags), поэтому
+# могут жить часами.
+FEED_CACHE_SETINGS = {
+    'TIMEOUT': 60 * 60 * 6
+}
+
+# Защита от давки при пересчёте кэша (core.stampede): истёкшее значение
+# ещё STALE_TIMEOUT секунд отдаётся, пока один запрос (под блокировкой
+# на LOCK_TIMEOUT секунд) считает новое. Без старого значения остальные
+# ждут его до WAIT секунд, проверяя кэш каждые POLL секунд. BETA > 1
+# обновляет значения раньше срока чаще, BETA = 0 — только по сроку.
+STAMPEDE_SETINGS = {
+    'BETA': 1.0,
+    'LOCK_TIMEOUT': 10,
+    'STALE_TIMEOUT': 60,
+    'WAIT': 2,
+    'POLL': 0.05,
+}
+
+# Кэш целых страниц для анонимов (core.page_cache): TIMEOUT — сколько
+# страница живёт в кэше сервера, MAX_AGE — сколько её держат браузер
+# и прокси, которых сброс по сигналам не достаёт.
+PAGE_CACHE_SETINGS = {
+    'ENABLED': True,
+    'TIMEOUT': 60 * 60 * 6,
+    'MAX_AGE': 30,
+}
+
+# Бюджет SQL-запросов на представление. Задаётся декоратором
+# core.query_budget.query_budget или здесь по имени маршрута.
+# Middleware проверяет его в разработке, QueryBudgetMixin — в тестах.
+QUERY_BUDGET_SETINGS = {
+    'ENABLED': DEBUG,
+    'DEFAULT': None,
+    'VIEWS': {},
 }
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
@@ -152,8 +287,52 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+THUMBNAIL_BACKEND = 'core.thumbnails.BackgroundThumbnailBackend'
+
+# Размеры, которые готовятся заранее; должны совпадать с {% thumbnail %}
+# в шаблонах, иначе шаблон будет получать оригинал. При WORKERS = 0
+# миниатюры создаются синхронно.
+THUMBNAIL_SETINGS = {
+    'WORKERS': 2,
+    'LRU_SIZE': 1024,
+    'SIZES': {
+        'feed': ('960x339', {'crop': 'center', 'upscale': True}),
+    },
+}
+
+# Единственный поток записи в SQLite (core.writer). Записи из запросов
+# ставятся в очередь и коммитятся пачками до MAX_BATCH штук; MAX_DELAY —
+# сколько секунд поток ждёт попутчиков, TIMEOUT — сколько запрос ждёт
+# места в полной очереди до WriterBusy.
+WRITER_SETINGS = {
+    'ENABLED': False,
+    'QUEUE_SIZE': 1000,
+    'MAX_BATCH': 64,
+    'MAX_DELAY': 0,
+    'TIMEOUT': 5,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
+
+# Кэш лежит в файле SQLite (core.cache.SQLiteCache) и общий
+# для всех воркеров узла: фрагменты и счётчики поколений не дублируются,
+# а сброс из одного процесса виден остальным.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.InstrumentedSQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {'MAX_ENTRIES': 20000},
     }
 }
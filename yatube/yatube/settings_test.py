@@ -0,0 +1,28 @@
+"""Настройки тестов: manage.py test и pytest берут их по умолчанию.
+
+Отличаются от рабочих только тем, что тестам мешает: общий файл кэша
+и счётчиков метрик, фоновые потоки миниатюр, проверка бюджета запросов
+в middleware. Тест, которому нужно рабочее поведение, включает его
+через override_settings.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import (LOGGING, METRICS_SETINGS, QUERY_BUDGET_SETINGS,
+                       THUMBNAIL_SETINGS)
+
+CACHES = {
+    'default': {'BACKEND': 'core.cache.InstrumentedLocMemCache'},
+}
+
+METRICS_SETINGS = {**METRICS_SETINGS, 'PATH': None}
+
+# Миниатюры создаются синхронно: фоновый поток иначе пишет во временный
+# MEDIA_ROOT, пока тест его удаляет.
+THUMBNAIL_SETINGS = {**THUMBNAIL_SETINGS, 'WORKERS': 0}
+
+# Бюджеты в тестах проверяет QueryBudgetMixin.
+QUERY_BUDGET_SETINGS = {**QUERY_BUDGET_SETINGS, 'ENABLED': False}
+
+LOGGING = {
+    **LOGGING,
+    'loggers': {'core': {**LOGGING['loggers']['core'], 'level': 'WARNING'}},
+}